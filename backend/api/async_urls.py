@@ -0,0 +1,13 @@
+from django.urls import path, re_path
+
+from api import async_views
+
+urlpatterns = [
+    path('recipes/', async_views.recipe_list),
+    re_path(r'^recipes/(?P<pk>\d+)/$', async_views.recipe_detail),
+    path('ingredients/', async_views.ingredient_list),
+    re_path(r'^ingredients/(?P<pk>\d+)/$', async_views.ingredient_detail),
+    path('tags/', async_views.tag_list),
+    re_path(r'^tags/(?P<pk>\d+)/$', async_views.tag_detail),
+    path('s/<int:pk>/', async_views.short_link_redirect),
+]
@@ -0,0 +1,300 @@
+"""Асинхронные представления горячих эндпоинтов каталога (ASGI).
+
+Обслуживают GET списков и карточек рецептов, ингредиентов и тегов и
+короткие ссылки через async ORM и асинхронный клиент кэша. Ответы
+совпадают с синхронными ViewSet: используются те же сериализаторы,
+фильтры, пагинация и записи кэша. Всё, что выходит за быстрый путь
+(запись, курсорная пагинация, браузерный API, ошибки аутентификации и
+фильтров, 404), передаётся синхронному представлению из `backend.urls`.
+"""
+from functools import partial, wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse
+from django.shortcuts import aget_object_or_404, redirect
+from django.urls import resolve
+from django.utils.cache import get_conditional_response
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from api.pagination import count_cache_key
+from api.serializers import (IngredientSerializer, RecipeSerializer,
+                             TagSerializer)
+from api.serializers.user_serializers import aget_subscribed_ids
+from api.views import IngredientViewSet, RecipeViewSet, TagViewSet
+from backend.async_cache import (acomplete_versions, aget_dependent,
+                                 aget_existing_versions, aset_dependent)
+from backend.mixins import (conditional_validators, public_cache_key,
+                            set_conditional_headers)
+from backend.replicas import replica_reads
+from recipes.ingredient_index import ingredient_index
+from recipes.models import Ingredient, Recipe, Tag
+
+SYNC_URLCONF = 'backend.urls'
+FAST_METHODS = ('GET', 'HEAD')
+RECIPE_LIST_PARAMS = (
+    'page', 'limit', 'tags', 'author', 'is_favorited',
+    'is_in_shopping_cart', 'search', 'ordering',
+)
+
+
+class Fallback(Exception):
+    """Запрос нужно обработать синхронным представлением."""
+
+
+async def sync_view(request):
+    """Передаёт запрос синхронному представлению того же адреса."""
+    match = resolve(request.path_info, urlconf=SYNC_URLCONF)
+    return await sync_to_async(match.func)(
+        request, *match.args, **match.kwargs
+    )
+
+
+async def authenticate(request):
+    """Пользователь по заголовку `Authorization: Token <key>`.
+
+    Повторяет TokenAuthentication; None означает ошибку аутентификации,
+    ответ на которую формирует синхронное представление.
+    """
+    header = request.META.get('HTTP_AUTHORIZATION', '').split()
+    if not header or header[0].lower() != 'token':
+        return AnonymousUser()
+    if len(header) != 2:
+        return None
+    token = await Token.objects.select_related('user').filter(
+        key=header[1]
+    ).afirst()
+    if token is None or not token.user.is_active:
+        return None
+    return token.user
+
+
+def json_response(data, status=200):
+    response = HttpResponse(
+        JSONRenderer().render(data),
+        content_type='application/json',
+        status=status,
+    )
+    response['Vary'] = 'Accept'
+    return response
+
+
+class Validators:
+    """ETag и Last-Modified как у ConditionalGetMixin ViewSet-а.
+
+    Версии, которых ещё нет в кэше, заводятся только после ответа 200
+    (`complete`), поэтому запрос несуществующего объекта ключей не
+    оставляет.
+    """
+
+    def __init__(self, request, conditional, kwargs):
+        viewset, action = conditional
+        self.request = request
+        self.view = viewset(
+            request=api_request(request), action=action, kwargs=kwargs
+        )
+        self.dependencies = self.view.get_conditional_dependencies()
+        self.etag = self.pending = None
+
+    async def load(self):
+        """Валидаторы по уже заведённым версиям, если есть все."""
+        if not self.dependencies:
+            return None
+        versions, since = await aget_existing_versions(self.dependencies)
+        if set(self.dependencies) - versions.keys():
+            self.pending = versions, since
+        else:
+            self.etag = self._validators(versions)
+        return self.etag
+
+    async def complete(self, response):
+        """Заводит недостающие версии после успешного ответа."""
+        if self.pending and response.status_code == 200:
+            versions = await acomplete_versions(
+                self.dependencies, *self.pending
+            )
+            if versions is not None:
+                self.etag = self._validators(versions)
+        if self.etag and response.status_code in (200, 304):
+            set_conditional_headers(
+                response, *self.etag, self.view.conditional_per_user
+            )
+
+    def _validators(self, versions):
+        return conditional_validators(
+            self.request,
+            self.view.action,
+            self.view.kwargs,
+            versions,
+            (self.request.user.pk
+             if self.view.conditional_per_user else None),
+        )
+
+
+def fast_view(params=(), conditional=None):
+    """Декоратор быстрого пути для GET с параметрами из `params`.
+
+    `conditional` — пара (ViewSet, действие), чьи валидаторы ответа
+    (ETag, Last-Modified) повторяет быстрый путь.
+    """
+    def decorator(view):
+        @csrf_exempt
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if (request.method not in FAST_METHODS
+                    or 'text/html' in request.headers.get('Accept', '')
+                    or not set(request.GET) <= set(params)):
+                return await sync_view(request)
+            user = await authenticate(request)
+            if user is None:
+                return await sync_view(request)
+            request.user = user
+            validators = conditional and Validators(
+                request, conditional, kwargs
+            )
+            etag = validators and await validators.load()
+            response = etag and get_conditional_response(request, *etag)
+            try:
+                response = response or json_response(
+                    await view(request, *args, **kwargs)
+                )
+            except (Fallback, ValidationError):
+                return await sync_view(request)
+            except APIException as exc:
+                data = exc.detail
+                if not isinstance(data, (list, dict)):
+                    data = {'detail': data}
+                return json_response(data, status=exc.status_code)
+            if validators:
+                await validators.complete(response)
+            return response
+        return wrapper
+    return decorator
+
+
+def api_request(request):
+    """DRF Request с уже определённым пользователем."""
+    drf_request = Request(request)
+    drf_request.user = request.user
+    return drf_request
+
+
+async def public_cached(request, action, kwargs, render):
+    """Асинхронный аналог `PublicResponseCacheMixin.cached_response`."""
+    if request.user.is_authenticated:
+        return await render()
+    view = RecipeViewSet(action=action, kwargs=kwargs)
+    key = public_cache_key(view.public_cache_prefix, request, action, kwargs)
+    data = await aget_dependent(key)
+    if data is None:
+        dependencies = view.get_cache_dependencies()
+        versions, since = await aget_existing_versions(dependencies)
+        with replica_reads(False):
+            data = await render()
+        versions = await acomplete_versions(dependencies, versions, since)
+        if versions is not None:
+            await aset_dependent(
+                key, data, versions,
+                timeout=settings.PUBLIC_RESPONSE_CACHE_TIMEOUT,
+            )
+    return data
+
+
+def filtered_recipes(view):
+    """Queryset списка рецептов с фильтрами и ключ кэша его размера."""
+    queryset = view.filter_queryset(view.get_queryset())
+    return queryset, count_cache_key(queryset, view.request, view)
+
+
+async def render_recipes(view, recipes):
+    request = view.request
+    if request.user.is_authenticated:
+        await aget_subscribed_ids(request)
+    return await RecipeSerializer(
+        context=view.get_serializer_context()
+    ).arender_many(recipes)
+
+
+async def render_recipe_list(request):
+    view = RecipeViewSet(
+        request=api_request(request), action='list', args=(), kwargs={},
+        format_kwarg=None,
+    )
+    queryset, count_key = await sync_to_async(filtered_recipes)(view)
+    paginator = view.paginator
+    recipes = await paginator.apaginate_queryset(
+        queryset, view.request, count_key
+    )
+    return paginator.get_paginated_response(
+        await render_recipes(view, recipes)
+    ).data
+
+
+async def render_recipe(request, pk):
+    view = RecipeViewSet(
+        request=api_request(request), action='retrieve', args=(),
+        kwargs={'pk': pk}, format_kwarg=None,
+    )
+    recipe = await Recipe.objects.with_flags(request.user).filter(
+        pk=pk
+    ).afirst()
+    if recipe is None:
+        raise Fallback
+    return (await render_recipes(view, [recipe]))[0]
+
+
+@fast_view(RECIPE_LIST_PARAMS)
+async def recipe_list(request):
+    return await public_cached(
+        request, 'list', {}, partial(render_recipe_list, request)
+    )
+
+
+@fast_view(conditional=(RecipeViewSet, 'retrieve'))
+async def recipe_detail(request, pk):
+    return await public_cached(
+        request, 'retrieve', {'pk': pk}, partial(render_recipe, request, pk)
+    )
+
+
+@fast_view(('name', 'limit'), (IngredientViewSet, 'list'))
+async def ingredient_list(request):
+    limit = request.GET.get('limit', '')
+    return await ingredient_index.asearch(
+        request.GET.get('name', ''),
+        int(limit) if limit.isdigit() else None,
+    )
+
+
+@fast_view(conditional=(IngredientViewSet, 'retrieve'))
+async def ingredient_detail(request, pk):
+    ingredient = await Ingredient.objects.filter(pk=pk).afirst()
+    if ingredient is None:
+        raise Fallback
+    return IngredientSerializer(ingredient).data
+
+
+@fast_view(conditional=(TagViewSet, 'list'))
+async def tag_list(request):
+    return TagSerializer(
+        [tag async for tag in Tag.objects.all()], many=True
+    ).data
+
+
+@fast_view(conditional=(TagViewSet, 'retrieve'))
+async def tag_detail(request, pk):
+    tag = await Tag.objects.filter(pk=pk).afirst()
+    if tag is None:
+        raise Fallback
+    return TagSerializer(tag).data
+
+
+async def short_link_redirect(request, pk):
+    """Перенаправляет с короткой ссылки на страницу рецепта."""
+    recipe = await aget_object_or_404(Recipe.objects.only('pk'), pk=pk)
+    return redirect('recipes-detail', pk=recipe.pk)
@@ -0,0 +1,91 @@
+import re
+
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+CHUNK_SIZE = 64 * 1024
+
+
+def parse_range(header, size):
+    """Разбирает заголовок Range с одним диапазоном.
+
+    Возвращает (start, end) включительно, None — если диапазон не задан
+    или не поддерживается, и False — если он не пересекается с файлом.
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    start, end = match.groups()
+    if not start:
+        start, end = max(size - int(end), 0), size - 1
+    else:
+        start = int(start)
+        end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def iter_file_range(file, start, length):
+    """Читает из файла `length` байт начиная со `start` кусками."""
+    with file:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def file_download_response(request, storage, name, etag, content_type,
+                           filename):
+    """Отдаёт файл из хранилища с поддержкой ETag и Range.
+
+    При совпадении If-None-Match возвращает 304, не открывая файл.
+    """
+    etag = f'"{etag}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = build_file_response(
+            request, storage, name, etag, content_type, filename
+        )
+    response['ETag'] = etag
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def build_file_response(request, storage, name, etag, content_type,
+                        filename):
+    size = storage.size(name)
+    range_header = request.headers.get('Range')
+    if_range = request.headers.get('If-Range')
+    byte_range = (
+        parse_range(range_header, size)
+        if range_header and if_range in (None, etag) else None
+    )
+    disposition = f'attachment; filename="{filename}"'
+
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+    if byte_range is None:
+        response = FileResponse(
+            storage.open(name, 'rb'), content_type=content_type
+        )
+        response['Content-Disposition'] = disposition
+        return response
+
+    start, end = byte_range
+    length = end - start + 1
+    response = StreamingHttpResponse(
+        iter_file_range(storage.open(name, 'rb'), start, length),
+        status=206,
+        content_type=content_type,
+    )
+    response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Content-Length'] = str(length)
+    response['Content-Disposition'] = disposition
+    return response
@@ -0,0 +1,72 @@
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from drf_extra_fields.fields import Base64ImageField
+from PIL import Image
+from rest_framework import serializers
+
+from backend.images import variant_url
+
+
+class UploadImageField(Base64ImageField):
+    """Изображение в base64 из JSON или файлом из multipart-формы.
+
+    Файл формы уже лежит во временном файле (`FILE_UPLOAD_HANDLERS`) и
+    проверяется по пути, без копирования в память. Размеры читаются из
+    заголовка до проверки Pillow, так что слишком большие изображения
+    отклоняются без декодирования.
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, UploadedFile):
+            self.validate_dimensions(data)
+            return serializers.ImageField.to_internal_value(self, data)
+        image = super().to_internal_value(data)
+        if image is not None:
+            self.validate_dimensions(image)
+        return image
+
+    def validate_dimensions(self, file):
+        """Проверяет ширину, высоту и число пикселей по заголовку."""
+        try:
+            with Image.open(file) as image:
+                width, height = image.size
+        except (OSError, Image.DecompressionBombError):
+            self.fail('invalid_image')
+        finally:
+            file.seek(0)
+        max_side = settings.IMAGE_UPLOAD_MAX_SIDE
+        if max(width, height) > max_side:
+            raise serializers.ValidationError(
+                f'Сторона изображения не должна превышать {max_side} px.'
+            )
+        if width * height > settings.IMAGE_UPLOAD_MAX_PIXELS:
+            raise serializers.ValidationError(
+                'Слишком большое изображение: '
+                f'{width}×{height} px.'
+            )
+
+
+class VariantImageField(UploadImageField):
+    """Загружаемое изображение и URL нужного варианта на выходе.
+
+    Пока варианты не созданы (или устарели), отдаёт URL оригинала.
+    """
+
+    def __init__(self, variant, variants_field='image_variants', **kwargs):
+        self.variant = variant
+        self.variants_field = variants_field
+        super().__init__(**kwargs)
+
+    def get_attribute(self, instance):
+        return (
+            super().get_attribute(instance),
+            getattr(instance, self.variants_field, None) or {},
+        )
+
+    def to_representation(self, value):
+        field_file, variants = value
+        url = variant_url(field_file, variants, self.variant)
+        request = self.context.get('request')
+        if url and request is not None:
+            return request.build_absolute_uri(url)
+        return url
@@ -1,6 +1,12 @@
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            TrigramSimilarity)
+from django.db.models import F, FloatField, Q
+from django.db.models.functions import Cast
 from django_filters.rest_framework import FilterSet, filters
+from rest_framework.filters import OrderingFilter
 
 from recipes.models import Ingredient, Recipe, Tag
+from recipes.querysets import SEARCH_CONFIG
 
 
 class RecipeFilter(FilterSet):
@@ -15,6 +21,7 @@ class RecipeFilter(FilterSet):
     is_in_shopping_cart = filters.BooleanFilter(
         method='get_is_in_shopping_cart'
     )
+    search = filters.CharFilter(method='get_search')
 
     class Meta:
         model = Recipe
@@ -33,6 +40,46 @@ class RecipeFilter(FilterSet):
             return queryset.filter(shoppinglist__user=self.request.user)
         return queryset
 
+    def get_search(self, queryset, name, value):
+        """Полнотекстовый поиск по названию, ингредиентам и описанию.
+
+        Опечатки в названии находит триграммное сходство (pg_trgm);
+        результаты сортируются по суммарной релевантности.
+        """
+        value = value.strip()
+        if not value:
+            return queryset
+        query = SearchQuery(
+            value, config=SEARCH_CONFIG, search_type='websearch'
+        )
+        return (
+            queryset.filter(
+                Q(search_vector=query) | Q(name__trigram_similar=value)
+            )
+            .annotate(
+                # double precision: значение без потерь проходит через
+                # позицию курсора и совпадает с ней при сравнении.
+                rank=Cast(
+                    SearchRank(F('search_vector'), query)
+                    + TrigramSimilarity('name', value),
+                    FloatField(),
+                )
+            )
+            .order_by('-rank', 'name')
+        )
+
+
+class StableOrderingFilter(OrderingFilter):
+    """Сортировка по параметру `ordering` с `id` для равных значений."""
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if not ordering:
+            return ordering
+        if {'id', '-id', 'pk', '-pk'} & set(ordering):
+            return tuple(ordering)
+        return (*ordering, 'id')
+
 
 class IngredientFilter(FilterSet):
     """Фильтр для ингредиентов."""
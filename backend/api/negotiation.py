@@ -0,0 +1,11 @@
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.settings import APISettings
+
+
+class FileFormatNegotiation(DefaultContentNegotiation):
+    """Согласование контента без `?format=`.
+
+    В выгрузках параметр `format` задаёт формат файла, а не рендерер DRF.
+    """
+
+    settings = APISettings({'URL_FORMAT_OVERRIDE': None})
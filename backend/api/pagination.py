@@ -1,7 +1,275 @@
-from rest_framework.pagination import PageNumberPagination
+import hashlib
+import json
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.core.paginator import InvalidPage, Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor
+from rest_framework.pagination import CursorPagination as BaseCursorPagination
+from rest_framework.pagination import PageNumberPagination, _reverse_ordering
+
+from backend.async_cache import async_cache
+from backend.cache import get_versions
+from backend.replicas import replica_reads
+
+PAGINATION_COUNT_KEY = 'pagination_count_{}'
+TRUE_VALUES = ('1', 'true', 'yes')
+
+
+def count_cache_key(queryset, request, view):
+    """Ключ кэша числа объектов queryset или None — считать точно.
+
+    Кэшируется только анонимный каталог: ViewSet перечисляет в
+    `count_cache_dependencies` версии, от которых зависит состав списка,
+    и они входят в ключ вместе с хэшем SQL. Списки с данными пользователя
+    (избранное, корзина, подписки) всегда считаются точно.
+    """
+    dependencies = getattr(view, 'count_cache_dependencies', None)
+    if dependencies is None or request.user.is_authenticated:
+        return None
+    try:
+        sql = str(queryset.query)
+    except EmptyResultSet:
+        return None
+    versions = get_versions(dependencies)
+    return PAGINATION_COUNT_KEY.format(hashlib.md5(
+        f'{sql}|{sorted(versions.items())}'.encode()
+    ).hexdigest())
+
+
+def cached_count(queryset, key):
+    """Число объектов queryset; с ключом — закэшированное на время.
+
+    `COUNT(*)` анонимного каталога не выполняется на каждой странице,
+    а любая запись в каталог меняет ключ.
+    """
+    if key is None:
+        return queryset.count()
+    count = cache.get(key)
+    if count is None:
+        with replica_reads(False):
+            count = queryset.count()
+        cache.set(key, count, timeout=settings.PAGINATION_COUNT_TIMEOUT)
+    return count
+
+
+async def acached_count(queryset, key):
+    """Асинхронный `cached_count`.
+
+    Ключ получают в потоке (`count_cache_key`): компиляция SQL может
+    обратиться к соединению с базой.
+    """
+    if key is None:
+        return await queryset.acount()
+    count = await async_cache.get(key)
+    if count is None:
+        with replica_reads(False):
+            count = await queryset.acount()
+        await async_cache.set(
+            key, count, timeout=settings.PAGINATION_COUNT_TIMEOUT
+        )
+    return count
+
+
+class CachedCountPaginator(Paginator):
+    """Paginator, берущий общее число объектов из кэша по ключу."""
+
+    def __init__(self, *args, count_key=None, **kwargs):
+        self.count_key = count_key
+        super().__init__(*args, **kwargs)
+
+    @cached_property
+    def count(self):
+        return cached_count(self.object_list, self.count_key)
 
 
 class PageNumberPagination(PageNumberPagination):
     """Кастомная пагинация с параметром `limit` для размера страницы."""
 
     page_size_query_param = 'limit'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.django_paginator_class = partial(
+            CachedCountPaginator,
+            count_key=count_cache_key(queryset, request, view),
+        )
+        return super().paginate_queryset(queryset, request, view)
+
+    async def apaginate_queryset(self, queryset, request, count_key):
+        """Асинхронный `paginate_queryset` для асинхронных представлений."""
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+        paginator = Paginator(queryset, page_size)
+        paginator.count = await acached_count(queryset, count_key)
+        page_number = self.get_page_number(request, paginator)
+        try:
+            number = paginator.validate_number(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(
+                page_number=page_number, message=str(exc)
+            ))
+        bottom = (number - 1) * page_size
+        objects = [obj async for obj in queryset[bottom:bottom + page_size]]
+        self.page = paginator._get_page(objects, number, paginator)
+        self.request = request
+        return objects
+
+
+class CursorPagination(BaseCursorPagination):
+    """Курсорная пагинация по ключу из всех полей сортировки.
+
+    В отличие от базового класса позиция курсора хранит значения всех
+    полей сортировки, а страница выбирается условием «строго после
+    ключа», поэтому добавление записей не сдвигает ленту и не даёт дублей.
+    Последним полем сортировки должен идти уникальный `id`.
+    С параметром `count=true` в ответ добавляется общее число объектов
+    (для анонимного каталога — из кэша, см. `count_cache_key`).
+    """
+
+    page_size_query_param = 'limit'
+    ordering = ('id',)
+    # Полнотекстовый поиск (`RecipeFilter.get_search`) сортирует по
+    # аннотации `rank`; курсор идёт по ней же, а не по `cursor_ordering`.
+    search_ordering = ('-rank', 'name', 'id')
+
+    def get_ordering(self, request, queryset, view):
+        """Сортировка из фильтра `ordering`, по релевантности поиска или
+        `cursor_ordering` ViewSet."""
+        for backend in getattr(view, 'filter_backends', ()):
+            if hasattr(backend, 'get_ordering'):
+                ordering = backend().get_ordering(request, queryset, view)
+                if ordering:
+                    return tuple(ordering)
+        if 'rank' in queryset.query.annotations:
+            return self.search_ordering
+        return tuple(getattr(view, 'cursor_ordering', self.ordering))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.count = None
+        if request.query_params.get('count', '').lower() in TRUE_VALUES:
+            self.count = cached_count(
+                queryset, count_cache_key(queryset, request, view)
+            )
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        reverse, position = False, None
+        if self.cursor is not None:
+            reverse, position = self.cursor.reverse, self.cursor.position
+
+        if reverse:
+            queryset = queryset.order_by(*_reverse_ordering(self.ordering))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+        if position is not None:
+            queryset = queryset.filter(self.get_key_filter(
+                self.ordering, json.loads(position), reverse
+            ))
+
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        has_more = len(results) > len(self.page)
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+        self.next_position = self.previous_position = position
+        if self.page:
+            self.next_position = self._get_position_from_instance(
+                self.page[-1], self.ordering
+            )
+            self.previous_position = self._get_position_from_instance(
+                self.page[0], self.ordering
+            )
+        return self.page
+
+    def decode_cursor(self, request):
+        cursor = super().decode_cursor(request)
+        if cursor is not None and cursor.position is not None:
+            try:
+                position = json.loads(cursor.position)
+            except ValueError:
+                raise NotFound(self.invalid_cursor_message)
+            if len(position) != len(self.ordering):
+                raise NotFound(self.invalid_cursor_message)
+        return cursor
+
+    @staticmethod
+    def get_key_filter(ordering, position, reverse):
+        """Условие «после ключа» для составной сортировки.
+
+        Для (a, b) это `a > x OR (a = x AND b > y)` с учётом направления
+        каждого поля и обратного курсора.
+        """
+        key_filter = Q()
+        equal = {}
+        for order, value in zip(ordering, position):
+            field = order.lstrip('-')
+            lookup = 'lt' if order.startswith('-') != reverse else 'gt'
+            key_filter |= Q(**equal, **{f'{field}__{lookup}': value})
+            equal[field] = value
+        return key_filter
+
+    def _get_position_from_instance(self, instance, ordering):
+        values = []
+        for order in ordering:
+            field = order.lstrip('-')
+            if isinstance(instance, dict):
+                values.append(instance[field])
+            else:
+                values.append(getattr(instance, field))
+        return json.dumps(values, ensure_ascii=False, default=str)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(
+            Cursor(offset=0, reverse=False, position=self.next_position)
+        )
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        return self.encode_cursor(
+            Cursor(offset=0, reverse=True, position=self.previous_position)
+        )
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        if self.count is not None:
+            response.data = {'count': self.count, **response.data}
+        return response
+
+
+class PaginationModeMixin:
+    """Миксин ViewSet: курсорная пагинация по параметру `pagination=cursor`.
+
+    Без параметра используется обычная постраничная пагинация.
+    Атрибут `cursor_ordering` задаёт сортировку ленты,
+    `count_cache_dependencies` — версии кэша, с которыми анонимный список
+    может брать общее число из кэша (None — всегда точный `COUNT`).
+    """
+
+    cursor_ordering = ('id',)
+    count_cache_dependencies = None
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            if self.request.query_params.get('pagination') == 'cursor':
+                self._paginator = CursorPagination()
+            else:
+                self._paginator = super().paginator
+        return self._paginator
@@ -1,4 +1,5 @@
 from .recipe_serializers import (FavoriteSerializer, IngredientSerializer,
+                                 RecipeIdsSerializer,
                                  RecipeIngredientSerializer, RecipeSerializer,
                                  ShoppingListSerializer, TagSerializer)
 from .short_serializers import ShortRecipeSerializer
@@ -15,6 +16,7 @@ __all__ = (
     'IngredientSerializer',
     'RecipeIngredientSerializer',
     'RecipeSerializer',
+    'RecipeIdsSerializer',
     'ShortRecipeSerializer',
     'FavoriteSerializer',
     'ShoppingListSerializer',
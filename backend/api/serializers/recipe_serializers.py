@@ -1,11 +1,24 @@
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.db import transaction
-from drf_extra_fields.fields import Base64ImageField
+from django.db.models import Manager
 from rest_framework import serializers
 from rest_framework.validators import UniqueTogetherValidator
 
-from api.serializers.user_serializers import UserProfileSerializer
+from api.fields import VariantImageField
+from api.serializers.user_serializers import (UserProfileSerializer,
+                                              get_subscribed_ids)
+from api.validators import validate_recipe_relations
+from backend.async_cache import aget_many_dependent
+from backend.cache import (INGREDIENTS, TAGS, get_many_dependent, get_versions,
+                           recipe_dependency, set_many_dependent,
+                           user_dependency)
+from backend.replicas import replica_reads
 from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
                             ShoppingList, Tag)
+from recipes.signals import recipe_ingredients_changed
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -37,13 +50,64 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount')
 
 
+RECIPE_FRAGMENT_KEY = 'recipe_fragment_{}_{}'
+VIEWER_FIELDS = ('is_favorited', 'is_in_shopping_cart')
+COUNTER_FIELDS = ('favorites_count', 'in_carts_count')
+FORM_LIST_FIELDS = ('tags', 'ingredients')
+
+
+def form_data_to_dict(data):
+    """Приводит multipart-форму рецепта к виду JSON-тела.
+
+    Списки передаются повторяющимися полями (`tags=1&tags=2`) или
+    JSON-строкой (`ingredients=[{"id": 1, "amount": 10}]`).
+    """
+    if not hasattr(data, 'getlist'):
+        return data
+    result = data.dict()
+    for field in FORM_LIST_FIELDS:
+        if field not in data:
+            continue
+        values = []
+        for value in data.getlist(field):
+            if (isinstance(value, str)
+                    and value.lstrip().startswith(('[', '{'))):
+                try:
+                    value = json.loads(value)
+                except ValueError:
+                    raise serializers.ValidationError(
+                        {field: ['Некорректный JSON.']}
+                    )
+            values.extend(value if isinstance(value, list) else [value])
+        result[field] = values
+    return result
+
+
+class RecipeListSerializer(serializers.ListSerializer):
+    """Список рецептов, собранный из кэшированных фрагментов."""
+
+    def to_representation(self, data):
+        recipes = data.all() if isinstance(data, Manager) else data
+        return self.child.render_many(list(recipes))
+
+
 class RecipeSerializer(serializers.ModelSerializer):
-    """Сериализатор для рецептов."""
+    """Сериализатор для рецептов.
+
+    Не зависящая от пользователя часть рецепта кэшируется фрагментом
+    и актуальна, пока не изменились рецепт, его автор, теги или
+    ингредиенты. Связанные объекты подгружаются только для промахов,
+    а флаги текущего пользователя и счётчики из строки рецепта
+    накладываются поверх фрагмента.
+    """
 
     author = UserProfileSerializer(read_only=True)
+    ingredients = RecipeIngredientSerializer(
+        source='recipes', many=True, read_only=True
+    )
     is_favorited = serializers.BooleanField(read_only=True)
     is_in_shopping_cart = serializers.BooleanField(read_only=True)
-    image = Base64ImageField(required=True, use_url=True)
+    image = VariantImageField(variant='large', required=True, use_url=True)
 
     class Meta:
         model = Recipe
@@ -54,49 +118,137 @@ class RecipeSerializer(serializers.ModelSerializer):
             'ingredients',
             'is_favorited',
             'is_in_shopping_cart',
+            'favorites_count',
+            'in_carts_count',
             'name',
             'image',
             'text',
             'cooking_time',
         )
-
-    def validate_ingredients(self, ingredients_data):
-        """Проверяет корректность списка ингредиентов."""
-        if not ingredients_data:
-            raise serializers.ValidationError(
-                'Необходимо добавить хотя бы один ингредиент.')
-
-        ingredient_ids = [item['id'] for item in ingredients_data]
-        if len(ingredient_ids) != len(set(ingredient_ids)):
-            raise serializers.ValidationError(
-                'Ингредиенты не должны повторяться.')
-
-        for item in ingredients_data:
-            amount = item.get('amount')
-            if amount is None or int(amount) <= 0:
-                raise serializers.ValidationError(
-                    'Количество ингредиента должно быть больше 0.'
-                )
-
-        return ingredients_data
+        list_serializer_class = RecipeListSerializer
+        # Теги и ингредиенты проверяет validate_recipe_relations.
+        read_only_fields = ('tags',)
 
     def to_representation(self, instance):
         """Формирует представление рецепта."""
+        return self.render_many([instance])[0]
+
+    def render_fragment(self, instance):
+        """Представление рецепта для кэша.
+
+        Значения полей текущего пользователя в нём не используются:
+        их заменяет `add_viewer_fields`.
+        """
         representation = super().to_representation(instance)
         representation['tags'] = TagSerializer(instance.tags, many=True).data
-        representation['ingredients'] = RecipeIngredientSerializer(
-            instance.recipes.all(), many=True
-        ).data
+        return representation
+
+    def render_many(self, recipes):
+        """Представления рецептов: фрагменты из кэша плюс флаги."""
+        request = self.context.get('request')
+        host = request.get_host() if request else ''
+        keys = [RECIPE_FRAGMENT_KEY.format(host, recipe.pk)
+                for recipe in recipes]
+        fragments = get_many_dependent(keys)
+        misses = {key: recipe for key, recipe in zip(keys, recipes)
+                  if key not in fragments}
+        if misses:
+            fragments.update(self.render_fragments(misses))
+        return [self.add_viewer_fields(fragments[key], recipe)
+                for key, recipe in zip(keys, recipes)]
+
+    async def arender_many(self, recipes):
+        """Асинхронный `render_many` для асинхронных представлений.
+
+        Фрагменты читаются асинхронным клиентом кэша, промахи рендерятся
+        в потоке. Id подписок пользователя должны быть загружены заранее
+        (`aget_subscribed_ids`).
+        """
+        request = self.context.get('request')
+        host = request.get_host() if request else ''
+        keys = [RECIPE_FRAGMENT_KEY.format(host, recipe.pk)
+                for recipe in recipes]
+        fragments = await aget_many_dependent(keys)
+        misses = {key: recipe for key, recipe in zip(keys, recipes)
+                  if key not in fragments}
+        if misses:
+            fragments.update(
+                await sync_to_async(self.render_fragments)(misses)
+            )
+        return [self.add_viewer_fields(fragments[key], recipe)
+                for key, recipe in zip(keys, recipes)]
+
+    def render_fragments(self, recipes):
+        """Рендерит и кэширует фрагменты рецептов {key: recipe}."""
+        dependencies = {
+            key: (recipe_dependency(recipe.pk),
+                  user_dependency(recipe.author_id), TAGS, INGREDIENTS)
+            for key, recipe in recipes.items()
+        }
+        versions = get_versions(
+            {dependency for deps in dependencies.values()
+             for dependency in deps}
+        )
+        # Строки перечитываются с primary после получения версий: так
+        # фрагмент не окажется старше своих версий, даже если рецепт
+        # изменили между загрузкой страницы и рендером или реплика отстаёт.
+        with replica_reads(False):
+            fresh = (
+                Recipe.objects.select_related('author')
+                .prefetch_related('tags', 'recipes__ingredient')
+                .in_bulk([recipe.pk for recipe in recipes.values()])
+            )
+        for recipe in fresh.values():
+            # Заглушки держат поля пользователя на своих местах во
+            # фрагменте; значения подставляет add_viewer_fields.
+            for field in VIEWER_FIELDS:
+                setattr(recipe, field, False)
+        fragments = {key: self.render_fragment(fresh.get(recipe.pk, recipe))
+                     for key, recipe in recipes.items()}
+        set_many_dependent(
+            {key: (fragments[key],
+                   {dependency: versions[dependency] for dependency in deps})
+             for key, deps in dependencies.items()},
+            timeout=settings.RECIPE_FRAGMENT_CACHE_TIMEOUT,
+        )
+        return fragments
+
+    def add_viewer_fields(self, fragment, recipe):
+        """Накладывает на фрагмент флаги пользователя и счётчики."""
+        representation = dict(fragment)
+        for field in COUNTER_FIELDS:
+            representation[field] = getattr(recipe, field)
+        for field in VIEWER_FIELDS:
+            if hasattr(recipe, field):
+                representation[field] = getattr(recipe, field)
+            else:
+                representation.pop(field, None)
+        request = self.context.get('request')
+        user = getattr(request, 'user', None)
+        representation['author'] = {
+            **fragment['author'],
+            'is_subscribed': bool(
+                user and user.is_authenticated
+                and recipe.author_id in get_subscribed_ids(request)
+            ),
+        }
         return representation
 
     def to_internal_value(self, data):
         """Преобразует внешние данные во внутренние."""
-        internal_value = super().to_internal_value(data)
-        tags = data.get('tags')
-        ingredients = data.get('ingredients')
-        internal_value['tags'] = tags
-        internal_value['ingredients'] = ingredients
-        return internal_value
+        data = form_data_to_dict(data)
+        errors = {}
+        try:
+            internal_value = super().to_internal_value(data)
+        except serializers.ValidationError as exc:
+            errors.update(exc.detail)
+        try:
+            relations = validate_recipe_relations(data, partial=self.partial)
+        except serializers.ValidationError as exc:
+            errors.update(exc.detail)
+        if errors:
+            raise serializers.ValidationError(errors)
+        return {**internal_value, **relations}
 
     def create_and_update_recipe_ingredients(self, recipe, ingredients):
         """Создает или обновляет ингредиенты рецепта."""
@@ -123,15 +275,79 @@ class RecipeSerializer(serializers.ModelSerializer):
         self.create_and_update_recipe_ingredients(recipe, ingredients)
         return recipe
 
+    def update_tags(self, recipe, tags):
+        """Добавляет новые и убирает лишние теги рецепта."""
+        new = set(tags)
+        old = set(recipe.tags.values_list('id', flat=True))
+        if new - old:
+            recipe.tags.add(*new - old)
+        if old - new:
+            recipe.tags.remove(*old - new)
+
+    def update_recipe_ingredients(self, recipe, ingredients):
+        """Вставляет, обновляет и удаляет только изменённые ингредиенты."""
+        new = {
+            int(ingredient['id']): int(ingredient['amount'])
+            for ingredient in ingredients
+        }
+        current = {
+            recipe_ingredient.ingredient_id: recipe_ingredient
+            for recipe_ingredient in RecipeIngredient.objects.filter(
+                recipe=recipe
+            )
+        }
+        old = {
+            ingredient_id: recipe_ingredient.amount
+            for ingredient_id, recipe_ingredient in current.items()
+        }
+        if new == old:
+            return
+
+        removed = [recipe_ingredient.pk
+                   for ingredient_id, recipe_ingredient in current.items()
+                   if ingredient_id not in new]
+        changed = []
+        for ingredient_id, recipe_ingredient in current.items():
+            amount = new.get(ingredient_id)
+            if amount is not None and amount != recipe_ingredient.amount:
+                recipe_ingredient.amount = amount
+                changed.append(recipe_ingredient)
+        if removed:
+            RecipeIngredient.objects.filter(pk__in=removed).delete()
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ['amount'])
+        self.create_and_update_recipe_ingredients(recipe, [
+            {'id': ingredient_id, 'amount': amount}
+            for ingredient_id, amount in new.items()
+            if ingredient_id not in current
+        ])
+        recipe_ingredients_changed.send(
+            sender=Recipe, recipe=recipe, old=old, new=new
+        )
+
     @transaction.atomic
     def update(self, instance, validated_data):
-        """Обновляет существующий рецепт."""
-        tags = validated_data.pop('tags', [])
-        ingredients = validated_data.pop('ingredients', [])
-        instance.tags.set(tags)
-        instance.ingredients.clear()
-        self.create_and_update_recipe_ingredients(instance, ingredients)
-        return super().update(instance, validated_data)
+        """Обновляет рецепт, записывая только изменившиеся данные.
+
+        Не переданные (при PATCH) теги и ингредиенты не трогаются,
+        рецепт сохраняется, только если изменились его собственные поля.
+        """
+        tags = validated_data.pop('tags', None)
+        ingredients = validated_data.pop('ingredients', None)
+        if tags is not None:
+            self.update_tags(instance, tags)
+        if ingredients is not None:
+            self.update_recipe_ingredients(instance, ingredients)
+
+        changed = {
+            field: value for field, value in validated_data.items()
+            if field == 'image' or getattr(instance, field) != value
+        }
+        if changed:
+            for field, value in changed.items():
+                setattr(instance, field, value)
+            instance.save(update_fields=list(changed))
+        return instance
 
 
 class BaseSerializer(serializers.ModelSerializer):
@@ -166,3 +382,27 @@ class ShoppingListSerializer(BaseSerializer):
 
     class Meta(BaseSerializer.Meta):
         model = ShoppingList
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    """Список id рецептов для пакетных операций."""
+
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BULK_RECIPES_MAX,
+    )
+
+    def validate_recipes(self, recipe_ids):
+        """Убирает повторы и проверяет, что все рецепты существуют."""
+        recipe_ids = list(dict.fromkeys(recipe_ids))
+        missing = set(recipe_ids) - set(
+            Recipe.objects.filter(id__in=recipe_ids)
+            .values_list('id', flat=True)
+        )
+        if missing:
+            raise serializers.ValidationError(
+                'Рецепты не найдены: '
+                f'{", ".join(map(str, sorted(missing)))}.'
+            )
+        return recipe_ids
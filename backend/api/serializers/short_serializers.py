@@ -1,13 +1,13 @@
-from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 
+from api.fields import VariantImageField
 from recipes.models import Recipe
 
 
 class ShortRecipeSerializer(serializers.ModelSerializer):
     """Короткий сериализатор для рецептов."""
 
-    image = Base64ImageField(required=True, use_url=True)
+    image = VariantImageField(variant='card', required=True, use_url=True)
 
     class Meta:
         model = Recipe
@@ -2,16 +2,42 @@ import string
 
 from django.contrib.auth import get_user_model
 from djoser.serializers import UserSerializer
-from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 
+from api.fields import UploadImageField
 from api.serializers.short_serializers import ShortRecipeSerializer
+from backend.images import variant_url
 from users.models import Subscription
 
 User = get_user_model()
 
 
+def get_subscribed_ids(request):
+    """Id авторов, на которых подписан пользователь запроса.
+
+    Загружаются одним запросом и переиспользуются всеми сериализаторами
+    в рамках одного HTTP-запроса.
+    """
+    if not hasattr(request, "subscribed_ids"):
+        request.subscribed_ids = set(
+            request.user.subscriptions.values_list("following_id", flat=True)
+        )
+    return request.subscribed_ids
+
+
+async def aget_subscribed_ids(request):
+    """Асинхронно загружает id авторов для `get_subscribed_ids`."""
+    if not hasattr(request, "subscribed_ids"):
+        request.subscribed_ids = {
+            following_id
+            async for following_id in Subscription.objects.filter(
+                follower_id=request.user.pk
+            ).values_list("following_id", flat=True)
+        }
+    return request.subscribed_ids
+
+
 class UserProfileSerializer(UserSerializer):
     """Сериализатор пользователя с подпиской и аватаром."""
 
@@ -31,24 +57,29 @@ class UserProfileSerializer(UserSerializer):
         )
 
     def get_is_subscribed(self, author):
-        """Проверяет, подписан ли текущий пользователь на автора."""
+        """Проверяет, подписан ли текущий пользователь на автора.
+
+        Использует аннотацию `is_subscribed`, если она есть у queryset,
+        иначе — множество подписок, загруженное один раз за запрос.
+        """
+        annotated = getattr(author, "is_subscribed", None)
+        if annotated is not None:
+            return annotated
         request = self.context.get("request")
         user = getattr(request, "user", None)
-        return (
-            user
-            and user.is_authenticated
-            and user.subscriptions.filter(following=author).exists()
-        )
+        if not (user and user.is_authenticated):
+            return False
+        return author.pk in get_subscribed_ids(request)
 
     def get_avatar(self, obj):
-        """Возвращает URL аватара."""
-        return obj.avatar.url if obj.avatar else None
+        """Возвращает URL уменьшенного аватара (или оригинала)."""
+        return variant_url(obj.avatar, obj.avatar_variants, "small")
 
 
 class AvatarSerializer(serializers.ModelSerializer):
     """Сериализатор для обновления и удаления аватара пользователя."""
 
-    avatar = Base64ImageField(required=False, allow_null=True)
+    avatar = UploadImageField(required=False, allow_null=True)
 
     class Meta:
         model = User
@@ -79,9 +110,7 @@ class UserSubscriptionSerializer(UserProfileSerializer):
     """Сериализатор подписки с рецептами пользователя."""
 
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.IntegerField(
-        source="recipes.count", read_only=True
-    )
+    recipes_count = serializers.SerializerMethodField()
 
     class Meta(UserProfileSerializer.Meta):
         fields = (
@@ -92,35 +121,52 @@ class UserSubscriptionSerializer(UserProfileSerializer):
 
     def validate_limit(self, value):
         """Проверяет, что limit — положительное целое число."""
-        if value is None:
+        if value in (None, ""):
             return None
 
         str_value = str(value)
         if not set(str_value) <= set(string.digits):
-            raise serializers.ValidationError(
-                {"limit": 'Параметр "limit" должен содержать только цифры.'}
-            )
+            raise serializers.ValidationError({
+                "recipes_limit":
+                    'Параметр "recipes_limit" должен содержать только цифры.'
+            })
 
         value = int(str_value)
         if value < 0:
-            raise serializers.ValidationError(
-                {"limit": 'Параметр "limit" должен быть положительным числом.'}
-            )
+            raise serializers.ValidationError({
+                "recipes_limit": (
+                    'Параметр "recipes_limit" должен быть '
+                    'положительным числом.'
+                )
+            })
 
         return value
 
-    def get_recipes(self, obj):
-        """Возвращает рецепты пользователя с ограничением по количеству."""
+    def get_recipes_limit(self):
+        """Возвращает проверенный параметр `recipes_limit` запроса."""
         request = self.context.get("request")
-        limit = request.query_params.get("limit")
-        limit = self.validate_limit(limit)
-        recipes = obj.recipes.all()
-        if limit:
-            recipes = recipes[:limit]
+        return self.validate_limit(request.query_params.get("recipes_limit"))
+
+    def get_recipes(self, obj):
+        """Возвращает рецепты пользователя с ограничением по количеству.
+
+        Использует рецепты, предзагруженные в `limited_recipes`, если они есть.
+        """
+        recipes = getattr(obj, "limited_recipes", None)
+        if recipes is None:
+            recipes = obj.recipes.all()
+            limit = self.get_recipes_limit()
+            if limit:
+                recipes = recipes[:limit]
         return ShortRecipeSerializer(
             recipes, many=True, context=self.context
         ).data
 
+    def get_recipes_count(self, obj):
+        """Количество рецептов автора (из аннотации, если она есть)."""
+        count = getattr(obj, "recipes_count", None)
+        return obj.recipes.count() if count is None else count
+
 
 class UnsubscribeSerializer(serializers.Serializer):
     """Сериализатор для проверки корректности отписки."""
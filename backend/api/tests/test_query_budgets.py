@@ -0,0 +1,428 @@
+"""Бюджеты SQL-запросов для маршрутов API.
+
+Для каждого маршрута из `api/urls.py` и каждого его метода в `BUDGETS`
+задано, сколько запросов к базе он может сделать при холодном кэше.
+Списки проверяются на нескольких размерах страницы: бюджет не зависит от
+размера, поэтому N+1 в сериализаторе сразу превышает его. Новый маршрут
+без бюджета роняет `test_every_route_has_budget`.
+
+Запуск (нужен PostgreSQL из настроек, Redis не нужен):
+
+    python manage.py test api
+"""
+import base64
+import shutil
+import tempfile
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.urls import URLPattern, URLResolver
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api import urls as api_urls
+from backend.celery import app as celery_app
+from backend.query_stats import QueryStats
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingList, Tag)
+from users.models import Subscription, User
+
+PAGE_SIZES = (1, 6, 20)
+METHODS = ('get', 'post', 'put', 'patch', 'delete')
+PASSWORD = 'Qwerty-123-budget'
+PNG = base64.b64decode(
+    'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAIAAACQd1PeAAAADElEQVR4nGP4z8AAAAMB'
+    'AQDJ/pLvAAAAAElFTkSuQmCC'
+)
+IMAGE = 'data:image/png;base64,' + base64.b64encode(PNG).decode()
+
+Case = namedtuple(
+    'Case',
+    ('route', 'method', 'user', 'path', 'status', 'budget', 'data'),
+    defaults=(None,),
+)
+
+# Путь форматируется id из фикстуры (`{recipe}`, `{author}`...); `{size}`
+# в пути — список, который проверяется на каждом размере из PAGE_SIZES.
+BUDGETS = (
+    Case('api-root', 'get', 'anon', '/api/', 200, 0),
+    Case('users-list', 'get', 'anon', '/api/users/?limit={size}', 200, 2),
+    Case('users-list', 'get', 'reader', '/api/users/?limit={size}', 200, 3),
+    Case('users-list', 'post', 'anon', '/api/users/', 201, 5, {
+        'email': 'new@example.com', 'username': 'new_user',
+        'first_name': 'Новый', 'last_name': 'Пользователь',
+        'password': PASSWORD,
+    }),
+    Case('users-detail', 'get', 'anon', '/api/users/{author}/', 401, 0),
+    Case('users-detail', 'get', 'reader', '/api/users/{author}/', 200, 2),
+    Case('users-detail', 'put', 'reader', '/api/users/{reader}/', 200, 4, {
+        'email': 'reader@example.com', 'username': 'reader',
+        'first_name': 'Читатель', 'last_name': 'Новый',
+    }),
+    Case('users-detail', 'patch', 'reader', '/api/users/{reader}/', 200, 3,
+         {'first_name': 'Читатель'}),
+    Case('users-detail', 'delete', 'reader', '/api/users/{reader}/', 204, 43,
+         {'current_password': PASSWORD}),
+    Case('users-me', 'get', 'reader', '/api/users/me/', 200, 2),
+    Case('users-me', 'put', 'reader', '/api/users/me/', 200, 4, {
+        'email': 'reader@example.com', 'username': 'reader',
+        'first_name': 'Читатель', 'last_name': 'Новый',
+    }),
+    Case('users-me', 'patch', 'reader', '/api/users/me/', 200, 3,
+         {'first_name': 'Читатель'}),
+    Case('users-me', 'delete', 'reader', '/api/users/me/', 204, 42,
+         {'current_password': PASSWORD}),
+    Case('users-avatar', 'put', 'reader', '/api/users/me/avatar/', 200, 2,
+         {'avatar': IMAGE}),
+    Case('users-avatar', 'delete', 'reader', '/api/users/me/avatar/', 204,
+         2),
+    Case('users-subscriptions', 'get', 'reader',
+         '/api/users/subscriptions/?limit={size}&recipes_limit={size}',
+         200, 4),
+    Case('users-subscribe', 'post', 'reader', '/api/users/{stranger}/'
+         'subscribe/', 201, 10),
+    Case('users-subscribe', 'delete', 'reader', '/api/users/{author}/'
+         'subscribe/', 204, 4),
+    Case('users-activation', 'post', 'anon', '/api/users/activation/', 400,
+         1, {'uid': 'MQ', 'token': 'bad-token'}),
+    Case('users-resend-activation', 'post', 'anon',
+         '/api/users/resend_activation/', 400, 1,
+         {'email': 'reader@example.com'}),
+    Case('users-reset-password', 'post', 'anon', '/api/users/reset_password/',
+         204, 1, {'email': 'reader@example.com'}),
+    Case('users-reset-password-confirm', 'post', 'anon',
+         '/api/users/reset_password_confirm/', 400, 1,
+         {'uid': 'MQ', 'token': 'bad-token', 'new_password': PASSWORD}),
+    Case('users-reset-username', 'post', 'anon', '/api/users/reset_email/',
+         204, 1, {'email': 'reader@example.com'}),
+    Case('users-reset-username-confirm', 'post', 'anon',
+         '/api/users/reset_email_confirm/', 400, 2,
+         {'uid': 'MQ', 'token': 'bad-token', 'new_email': 'x@example.com'}),
+    Case('users-set-password', 'post', 'reader', '/api/users/set_password/',
+         204, 2, {'current_password': PASSWORD,
+                  'new_password': PASSWORD + 'x'}),
+    Case('users-set-username', 'post', 'reader', '/api/users/set_email/',
+         204, 3, {'current_password': PASSWORD,
+                  'new_email': 'reader2@example.com'}),
+    Case('login', 'post', 'anon', '/api/auth/token/login/', 200, 3,
+         {'email': 'reader@example.com', 'password': PASSWORD}),
+    Case('logout', 'post', 'reader', '/api/auth/token/logout/', 204, 2),
+    Case('recipes-list', 'get', 'anon', '/api/recipes/?limit={size}', 200,
+         6),
+    Case('recipes-list', 'get', 'reader', '/api/recipes/?limit={size}', 200,
+         8),
+    Case('recipes-list', 'get', 'reader',
+         '/api/recipes/?limit={size}&is_favorited=1&tags={tag_slug}', 200, 9),
+    Case('recipes-list', 'get', 'reader',
+         '/api/recipes/?limit={size}&author={author}&is_in_shopping_cart=1',
+         200, 9),
+    Case('recipes-list', 'get', 'anon',
+         '/api/recipes/?pagination=cursor&limit={size}', 200, 5),
+    Case('recipes-list', 'post', 'author', '/api/recipes/', 201, 16, {
+        'name': 'Новый рецепт', 'text': 'Описание', 'cooking_time': 10,
+        'image': IMAGE, 'tags': '{tag_ids}',
+        'ingredients': '{ingredient_amounts}',
+    }),
+    Case('recipes-detail', 'get', 'anon', '/api/recipes/{recipe}/', 200, 5),
+    Case('recipes-detail', 'get', 'reader', '/api/recipes/{recipe}/', 200,
+         7),
+    Case('recipes-detail', 'put', 'author', '/api/recipes/{own_recipe}/',
+         200, 20, {
+             'name': 'Изменённый рецепт', 'text': 'Описание',
+             'cooking_time': 15, 'image': IMAGE, 'tags': '{tag_ids}',
+             'ingredients': '{ingredient_amounts}',
+         }),
+    Case('recipes-detail', 'patch', 'author', '/api/recipes/{own_recipe}/',
+         200, 11, {'cooking_time': 25}),
+    Case('recipes-detail', 'delete', 'author', '/api/recipes/{own_recipe}/',
+         204, 11),
+    Case('recipes-get-link', 'get', 'anon', '/api/recipes/{recipe}/get-link/',
+         200, 1),
+    Case('recipes-favorite', 'post', 'reader',
+         '/api/recipes/{new_recipe}/favorite/', 201, 2),
+    Case('recipes-favorite', 'delete', 'reader',
+         '/api/recipes/{favorite}/favorite/', 204, 2),
+    Case('recipes-add-to-cart', 'post', 'reader',
+         '/api/recipes/{new_recipe}/shopping_cart/', 201, 5),
+    Case('recipes-add-to-cart', 'delete', 'reader',
+         '/api/recipes/{in_cart}/shopping_cart/', 204, 5),
+    Case('recipes-bulk-favorite', 'post', 'reader', '/api/recipes/favorite/',
+         201, 3, {'recipes': '{page_ids}'}),
+    Case('recipes-bulk-favorite', 'delete', 'reader',
+         '/api/recipes/favorite/', 204, 3, {'recipes': '{page_ids}'}),
+    Case('recipes-clear-favorites', 'delete', 'reader',
+         '/api/recipes/favorite/clear/', 204, 2),
+    Case('recipes-bulk-add-to-cart', 'post', 'reader',
+         '/api/recipes/shopping_cart/', 201, 6, {'recipes': '{page_ids}'}),
+    Case('recipes-bulk-add-to-cart', 'delete', 'reader',
+         '/api/recipes/shopping_cart/', 204, 6, {'recipes': '{page_ids}'}),
+    Case('recipes-clear-cart', 'delete', 'reader',
+         '/api/recipes/shopping_cart/clear/', 204, 5),
+    Case('recipes-download-shopping-cart', 'get', 'reader',
+         '/api/recipes/download_shopping_cart/', 200, 3),
+    Case('recipes-shopping-cart-job', 'get', 'reader',
+         '/api/recipes/download_shopping_cart/unknown-job/', 404, 1),
+    Case('short-link', 'get', 'anon', '/api/s/{recipe}/', 302, 1),
+    Case('ingredients-list', 'get', 'anon',
+         '/api/ingredients/?name=%D0%B8%D0%BD&limit={size}', 200, 1),
+    Case('ingredients-list', 'post', 'anon', '/api/ingredients/', 401, 0,
+         {'name': 'соль', 'measurement_unit': 'г'}),
+    Case('ingredients-detail', 'get', 'anon', '/api/ingredients/{ingredient}/',
+         200, 1),
+    Case('ingredients-detail', 'put', 'anon', '/api/ingredients/{ingredient}/',
+         401, 0, {'name': 'соль', 'measurement_unit': 'г'}),
+    Case('ingredients-detail', 'patch', 'anon',
+         '/api/ingredients/{ingredient}/', 401, 0, {'name': 'соль'}),
+    Case('ingredients-detail', 'delete', 'anon',
+         '/api/ingredients/{ingredient}/', 401, 0),
+    Case('tags-list', 'get', 'anon', '/api/tags/', 200, 1),
+    Case('tags-list', 'post', 'anon', '/api/tags/', 401, 0,
+         {'name': 'Ужин', 'slug': 'dinner'}),
+    Case('tags-detail', 'get', 'anon', '/api/tags/{tag}/', 200, 1),
+    Case('tags-detail', 'put', 'anon', '/api/tags/{tag}/', 401, 0,
+         {'name': 'Ужин', 'slug': 'dinner'}),
+    Case('tags-detail', 'patch', 'anon', '/api/tags/{tag}/', 401, 0,
+         {'name': 'Ужин'}),
+    Case('tags-detail', 'delete', 'anon', '/api/tags/{tag}/', 401, 0),
+    Case('db-pool-stats', 'get', 'admin', '/api/health/db-pool/', 200, 1),
+)
+
+
+def api_routes(patterns=api_urls.urlpatterns, prefix=''):
+    """(шаблон, имя, методы) достижимых маршрутов API без суффиксов формата.
+
+    Маршруты, перекрытые более ранними с тем же шаблоном (djoser
+    регистрирует `users/` второй раз), пропускаются.
+    """
+    seen = set()
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            for route in api_routes(
+                pattern.url_patterns, prefix + str(pattern.pattern)
+            ):
+                if route[0] not in seen:
+                    seen.add(route[0])
+                    yield route
+            continue
+        route = prefix + str(pattern.pattern)
+        if 'format' in route or route in seen:
+            continue
+        seen.add(route)
+        yield route, pattern.name, route_methods(pattern)
+
+
+def route_methods(pattern: URLPattern):
+    callback = pattern.callback
+    if getattr(callback, 'actions', None):
+        return set(callback.actions) & set(METHODS)
+    view_class = getattr(callback, 'cls', None) or getattr(
+        callback, 'view_class', None
+    )
+    if view_class is None:
+        return {'get'}
+    return {method for method in METHODS if hasattr(view_class, method)}
+
+
+@override_settings(
+    CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+    },
+    DATABASE_REPLICAS=[],
+    DJOSER={
+        **settings.DJOSER,
+        'PASSWORD_RESET_CONFIRM_URL': 'reset/{uid}/{token}',
+        'USERNAME_RESET_CONFIRM_URL': 'reset-email/{uid}/{token}',
+    },
+)
+class QueryBudgetTests(TestCase):
+    """Число запросов каждого маршрута при холодном кэше."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp()
+        cls.media_override = override_settings(
+            MEDIA_ROOT=cls.media_root,
+            STORAGES={
+                **settings.STORAGES,
+                'shopping_lists': {
+                    **settings.STORAGES['shopping_lists'],
+                    'OPTIONS': {'location': f'{cls.media_root}/exports'},
+                },
+            },
+        )
+        cls.media_override.enable()
+        cls.celery_eager = celery_app.conf.task_always_eager
+        celery_app.conf.task_always_eager = True
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        celery_app.conf.task_always_eager = cls.celery_eager
+        cls.media_override.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+
+    @classmethod
+    def setUpTestData(cls):
+        def user(name, **kwargs):
+            return User.objects.create_user(
+                email=f'{name}@example.com', username=name, password=PASSWORD,
+                first_name=name.title(), last_name='Тестов', **kwargs,
+            )
+
+        cls.users = {
+            'reader': user('reader'),
+            'author': user('author'),
+            'admin': user('admin', is_staff=True),
+        }
+        stranger = user('stranger')
+        authors = [cls.users['author']] + [
+            user(f'author{number}') for number in range(5)
+        ]
+        tags = [
+            Tag.objects.create(
+                name=f'Тег {number}', color='#ffffff', slug=f'tag{number}'
+            )
+            for number in range(4)
+        ]
+        ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'ингредиент {number}', measurement_unit='г')
+            for number in range(40)
+        )
+        recipes = []
+        for number in range(30):
+            recipe = Recipe.objects.create(
+                author=authors[number % len(authors)],
+                name=f'Рецепт {number}',
+                text='Описание рецепта',
+                cooking_time=5 + number,
+                image=ContentFile(PNG, name='recipe.png'),
+            )
+            recipe.tags.set(tags[number % 3:number % 3 + 2])
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(
+                    recipe=recipe,
+                    ingredient=ingredients[(number + shift) % 40],
+                    amount=10 * (shift + 1),
+                )
+                for shift in range(5)
+            )
+            recipes.append(recipe)
+        stranger_recipe = Recipe.objects.create(
+            author=stranger, name='Чужой рецепт', text='Описание',
+            cooking_time=5, image=ContentFile(PNG, name='recipe.png'),
+        )
+
+        reader = cls.users['reader']
+        reader.avatar = ContentFile(PNG, name='avatar.png')
+        reader.save()
+        for author in authors:
+            Subscription.objects.create(follower=reader, following=author)
+        for recipe in recipes[:10]:
+            Favorite.objects.create(user=reader, recipe=recipe)
+        for recipe in recipes[5:13]:
+            ShoppingList.objects.create(user=reader, recipe=recipe)
+        cls.tokens = {
+            name: Token.objects.create(user=account).key
+            for name, account in cls.users.items()
+        }
+
+        own_recipe = next(
+            recipe for recipe in recipes
+            if recipe.author_id == cls.users['author'].pk
+        )
+        cls.ids = {
+            'reader': reader.pk,
+            'author': cls.users['author'].pk,
+            'stranger': stranger.pk,
+            'recipe': recipes[7].pk,
+            'own_recipe': own_recipe.pk,
+            'new_recipe': stranger_recipe.pk,
+            'favorite': recipes[0].pk,
+            'in_cart': recipes[6].pk,
+            'tag': tags[0].pk,
+            'tag_slug': tags[1].slug,
+            'ingredient': ingredients[0].pk,
+        }
+        cls.values = {
+            '{tag_ids}': [tag.pk for tag in tags[:2]],
+            '{ingredient_amounts}': [
+                {'id': ingredient.pk, 'amount': 100}
+                for ingredient in ingredients[20:25]
+            ],
+            '{page_ids}': [recipe.pk for recipe in recipes[8:20]],
+        }
+
+    def client_for(self, name):
+        client = APIClient()
+        if name != 'anon':
+            client.credentials(
+                HTTP_AUTHORIZATION=f'Token {self.tokens[name]}'
+            )
+        return client
+
+    def request_data(self, data):
+        if data is None:
+            return None
+        return {
+            key: self.values.get(value, value)
+            if isinstance(value, str) else value
+            for key, value in data.items()
+        }
+
+    def measure(self, case, path):
+        """Выполняет запрос при пустом кэше и откатывает его изменения."""
+        client = self.client_for(case.user)
+        cache.clear()
+        savepoint = transaction.savepoint()
+        try:
+            with QueryStats() as stats:
+                response = getattr(client, case.method)(
+                    path, self.request_data(case.data), format='json'
+                )
+        finally:
+            transaction.savepoint_rollback(savepoint)
+        return response, stats
+
+    def test_every_route_has_budget(self):
+        budgeted = {(case.route, case.method) for case in BUDGETS}
+        missing = sorted(
+            f'{method.upper()} {route} ({name})'
+            for route, name, methods in api_routes()
+            for method in methods
+            if (name, method) not in budgeted
+        )
+        self.assertEqual(missing, [], 'Маршруты без бюджета запросов')
+
+    def test_query_budgets(self):
+        for case in BUDGETS:
+            sizes = PAGE_SIZES if '{size}' in case.path else (None,)
+            for size in sizes:
+                path = case.path.format(size=size, **self.ids)
+                with self.subTest(method=case.method, path=path,
+                                  user=case.user):
+                    response, stats = self.measure(case, path)
+                    self.assertEqual(
+                        response.status_code, case.status,
+                        getattr(response, 'data', None),
+                    )
+                    self.assertLessEqual(
+                        stats.count, case.budget,
+                        f'{case.method.upper()} {path}: {stats.count} '
+                        f'запросов при бюджете {case.budget}\n'
+                        f'{stats.report()}',
+                    )
+
+    @override_settings(QUERY_STATS=True)
+    def test_query_stats_headers(self):
+        response = self.client_for('reader').get('/api/recipes/?limit=6')
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(int(response['X-Query-Count']), 0)
+        self.assertEqual(response['X-Query-Duplicates'], '0')
+        self.assertIn('db;dur=', response['Server-Timing'])
@@ -1,8 +1,8 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from api.views import (IngredientViewSet, RecipeViewSet, TagViewSet,
-                       UserSubscribeView, short_link_redirect)
+from api.views import (DatabasePoolStatsView, IngredientViewSet, RecipeViewSet,
+                       TagViewSet, UserSubscribeView, short_link_redirect)
 
 router = DefaultRouter()
 
@@ -16,4 +16,9 @@ urlpatterns = [
     path('', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken')),
     path('s/<int:pk>/', short_link_redirect, name='short-link'),
+    path(
+        'health/db-pool/',
+        DatabasePoolStatsView.as_view(),
+        name='db-pool-stats',
+    ),
 ]
@@ -0,0 +1,120 @@
+from django.conf import settings
+from rest_framework import serializers
+
+from recipes.models import Ingredient, Tag
+
+REQUIRED_MESSAGE = 'Обязательное поле.'
+
+
+def parse_tags(tags):
+    """Список id тегов без проверки существования."""
+    if not isinstance(tags, list):
+        raise serializers.ValidationError('Ожидался список id тегов.')
+    if not tags:
+        raise serializers.ValidationError(
+            'Необходимо добавить хотя бы один тег.')
+    id_field = serializers.IntegerField(min_value=1)
+    tag_ids = [id_field.run_validation(tag) for tag in tags]
+    if len(tag_ids) != len(set(tag_ids)):
+        raise serializers.ValidationError('Теги не должны повторяться.')
+    return tag_ids
+
+
+def parse_ingredients(ingredients):
+    """Список {'id', 'amount'} с приведёнными к int значениями."""
+    if not isinstance(ingredients, list):
+        raise serializers.ValidationError('Ожидался список ингредиентов.')
+    if not ingredients:
+        raise serializers.ValidationError(
+            'Необходимо добавить хотя бы один ингредиент.')
+    id_field = serializers.IntegerField(min_value=1)
+    amount_field = serializers.IntegerField(
+        min_value=settings.MIN_AMOUNT, max_value=settings.MAX_AMOUNT
+    )
+    parsed = []
+    for item in ingredients:
+        if not isinstance(item, dict):
+            raise serializers.ValidationError(
+                'Ингредиент задаётся объектом {"id": ..., "amount": ...}.')
+        values = {}
+        for key, field in (('id', id_field), ('amount', amount_field)):
+            try:
+                values[key] = field.run_validation(item.get(key))
+            except serializers.ValidationError as exc:
+                raise serializers.ValidationError({key: exc.detail})
+        parsed.append(values)
+    ingredient_ids = [item['id'] for item in parsed]
+    if len(ingredient_ids) != len(set(ingredient_ids)):
+        raise serializers.ValidationError(
+            'Ингредиенты не должны повторяться.')
+    return parsed
+
+
+def missing_ids(model, ids):
+    """Id из набора, которых нет в таблице модели (один запрос)."""
+    if not ids:
+        return set()
+    return set(ids) - set(
+        model.objects.filter(id__in=ids).values_list('id', flat=True)
+    )
+
+
+def format_ids(ids):
+    return ', '.join(map(str, sorted(ids)))
+
+
+def validate_many_recipe_relations(recipes, partial=False):
+    """Проверяет теги и ингредиенты нескольких рецептов.
+
+    `recipes` — сырые данные рецептов с ключами `tags` и `ingredients`.
+    Существование id проверяется двумя запросами на все рецепты, сколько
+    бы в них ни было тегов и ингредиентов. Возвращает проверенные
+    значения по рецептам; ошибки собираются в список по их порядку.
+    """
+    parsed, errors = [], []
+    for data in recipes:
+        values, error = {}, {}
+        for field, parse in (
+            ('tags', parse_tags), ('ingredients', parse_ingredients)
+        ):
+            if field not in data:
+                if not partial:
+                    error[field] = [REQUIRED_MESSAGE]
+                continue
+            try:
+                values[field] = parse(data[field])
+            except serializers.ValidationError as exc:
+                error[field] = exc.detail
+        parsed.append(values)
+        errors.append(error)
+
+    missing_tags = missing_ids(
+        Tag, {tag_id for values in parsed
+              for tag_id in values.get('tags', ())}
+    )
+    missing_ingredients = missing_ids(
+        Ingredient, {item['id'] for values in parsed
+                     for item in values.get('ingredients', ())}
+    )
+    for values, error in zip(parsed, errors):
+        missing = missing_tags.intersection(values.get('tags', ()))
+        if missing:
+            error['tags'] = [f'Теги не найдены: {format_ids(missing)}.']
+        missing = missing_ingredients.intersection(
+            item['id'] for item in values.get('ingredients', ())
+        )
+        if missing:
+            error['ingredients'] = [
+                f'Ингредиенты не найдены: {format_ids(missing)}.'
+            ]
+    if any(errors):
+        raise serializers.ValidationError(errors)
+    return parsed
+
+
+def validate_recipe_relations(data, partial=False):
+    """Проверяет теги и ингредиенты одного рецепта."""
+    try:
+        return validate_many_recipe_relations([data], partial)[0]
+    except serializers.ValidationError as exc:
+        raise serializers.ValidationError(exc.detail[0])
@@ -1,8 +1,10 @@
+from .health_views import DatabasePoolStatsView
 from .recipe_views import (IngredientViewSet, RecipeViewSet, TagViewSet,
                            short_link_redirect)
 from .user_views import UserSubscribeView
 
 __all__ = (
+    'DatabasePoolStatsView',
     'UserSubscribeView',
     'RecipeViewSet',
     'IngredientViewSet',
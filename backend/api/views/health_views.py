@@ -0,0 +1,30 @@
+import os
+
+from django.db import connections
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+
+class DatabasePoolStatsView(APIView):
+    """Состояние соединений с базами данных для администраторов.
+
+    У каждого воркера gunicorn и Celery свой пул, поэтому ответ описывает
+    только процесс, обработавший запрос (его `pid` есть в ответе).
+    """
+
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        databases = {}
+        for connection in connections.all():
+            pool = getattr(connection, 'pool', None)
+            databases[connection.alias] = {
+                'pooled': pool is not None,
+                'conn_max_age': connection.settings_dict['CONN_MAX_AGE'],
+                'health_checks': connection.settings_dict[
+                    'CONN_HEALTH_CHECKS'
+                ],
+                'stats': pool.get_stats() if pool is not None else None,
+            }
+        return Response({'pid': os.getpid(), 'databases': databases})
@@ -1,8 +1,14 @@
-from django.http import HttpResponse
+from celery.exceptions import TimeoutError as CeleryTimeoutError
+from celery.result import AsyncResult
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import storages
 from django.shortcuts import get_object_or_404, redirect
 from django.urls import reverse
 from django_filters.rest_framework import DjangoFilterBackend
+from rest_framework import status
 from rest_framework.decorators import action
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
 from rest_framework.permissions import (
     IsAuthenticated,
     IsAuthenticatedOrReadOnly,
@@ -10,18 +16,32 @@ from rest_framework.permissions import (
 from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet
 
-from api.filters import IngredientFilter, RecipeFilter
+from api.downloads import file_download_response
+from api.filters import IngredientFilter, RecipeFilter, StableOrderingFilter
+from api.negotiation import FileFormatNegotiation
+from api.pagination import PaginationModeMixin
 from api.permissions import IsOwnerOrAdminOrReadOnly
 from api.serializers import (
     FavoriteSerializer,
     IngredientSerializer,
+    RecipeIdsSerializer,
     RecipeSerializer,
     ShoppingListSerializer,
     TagSerializer,
 )
-from backend.mixins import CreateDeleteMixin
+from backend.cache import (INGREDIENTS, RECIPES, TAGS, USERS,
+                           recipe_dependency, recipe_stats_dependency,
+                           subscriptions_dependency)
+from backend.mixins import (ConditionalGetMixin, CreateDeleteMixin,
+                            PublicResponseCacheMixin)
+from recipes.exports import EXPORT_FORMATS
+from recipes.ingredient_index import ingredient_index
 from recipes.models import Favorite, Ingredient, Recipe, ShoppingList, Tag
-from recipes.tasks import generate_shopping_list_text
+from recipes.tasks import (SHOPPING_LIST_STORAGE, generate_shopping_list,
+                           get_cached_shopping_list)
+
+SHOPPING_LIST_JOB_KEY = 'shopping_list_job_{}'
+TRUE_VALUES = ('1', 'true', 'yes')
 
 
 class BaseReadOnlyViewSet(ModelViewSet):
@@ -30,38 +50,179 @@ class BaseReadOnlyViewSet(ModelViewSet):
     pagination_class = None
 
 
-class RecipeViewSet(CreateDeleteMixin, ModelViewSet):
-    """ViewSet для рецептов с дополнительными действиями."""
+class RecipeViewSet(
+    ConditionalGetMixin,
+    PublicResponseCacheMixin,
+    PaginationModeMixin,
+    CreateDeleteMixin,
+    ModelViewSet,
+):
+    """ViewSet для рецептов с дополнительными действиями.
+
+    Рецепт принимается как JSON с изображением в base64 или как
+    multipart-форма с файлом `image`.
+    """
 
+    cursor_ordering = ("name", "id")
+    count_cache_dependencies = (RECIPES,)
+    public_cache_prefix = "recipes"
     queryset = Recipe.objects.all()
     serializer_class = RecipeSerializer
+    parser_classes = (JSONParser, MultiPartParser, FormParser)
     permission_classes = (IsOwnerOrAdminOrReadOnly, IsAuthenticatedOrReadOnly)
     filterset_class = RecipeFilter
-    filter_backends = (DjangoFilterBackend,)
+    filter_backends = (DjangoFilterBackend, StableOrderingFilter)
+    ordering_fields = ("name", "favorites_count", "in_carts_count")
+    conditional_per_user = True
 
     def get_queryset(self):
-        """Оптимизированный queryset с предзагрузкой связанных данных."""
-        user = self.request.user
-        return (
-            Recipe.objects.with_flags(user)
-            .select_related("author")
-            .prefetch_related("tags", "recipes__ingredient")
+        """Рецепты с флагами пользователя.
+
+        Автора, теги и ингредиенты подгружает сериализатор, и только для
+        рецептов, которых нет в кэше фрагментов.
+        """
+        return Recipe.objects.with_flags(self.request.user)
+
+    def get_cache_dependencies(self):
+        """Зависимости кэша анонимных ответов.
+
+        Рецепт зависит от себя и своих счётчиков, списки — от поколения
+        каталога: счётчики в них обновляются по истечении таймаута.
+        """
+        if self.action == "retrieve":
+            return (
+                recipe_dependency(self.kwargs["pk"]),
+                recipe_stats_dependency(self.kwargs["pk"]),
+                TAGS,
+                INGREDIENTS,
+                USERS,
+            )
+        return (RECIPES, TAGS, INGREDIENTS, USERS)
+
+    def get_conditional_dependencies(self):
+        """Валидаторы только у карточки рецепта.
+
+        Флаги избранного и корзины меняют версию счётчиков рецепта, флаг
+        подписки на автора — версию подписок пользователя. В списках
+        счётчики не версионируются, поэтому они отдаются без валидаторов.
+        """
+        if self.action != "retrieve":
+            return ()
+        dependencies = self.get_cache_dependencies()
+        if self.request.user.is_authenticated:
+            dependencies += (subscriptions_dependency(self.request.user.pk),)
+        return dependencies
+
+    @staticmethod
+    def shopping_list_response(request, export_file):
+        """Отдаёт сформированный файл списка покупок."""
+        export_format = export_file["format"]
+        return file_download_response(
+            request,
+            storages[SHOPPING_LIST_STORAGE],
+            export_file["name"],
+            export_file["etag"],
+            EXPORT_FORMATS[export_format].content_type,
+            f"shopping_list.{export_format}",
+        )
+
+    def shopping_list_job_response(self, request, task):
+        """Отвечает 202 со ссылкой на статус задачи формирования списка."""
+        cache.set(
+            SHOPPING_LIST_JOB_KEY.format(task.id),
+            request.user.id,
+            timeout=settings.SHOPPING_LIST_JOB_TIMEOUT,
+        )
+        status_url = request.build_absolute_uri(
+            reverse("recipes-shopping-cart-job", args=[task.id])
+        )
+        return Response(
+            {"job_id": task.id, "status": task.status, "url": status_url},
+            status=status.HTTP_202_ACCEPTED,
+            headers={"Location": status_url},
         )
 
     @action(
         detail=False,
         url_path="download_shopping_cart",
         permission_classes=(IsAuthenticated,),
+        content_negotiation_class=FileFormatNegotiation,
     )
     def download_shopping_cart(self, request):
-        """Скачать список покупок."""
-        task = generate_shopping_list_text.delay(request.user.id)
-        content = task.get(interval=0.1)
-        response = HttpResponse(content, content_type="text/plain")
-        response["Content-Disposition"] = (
-            'attachment; filename="shopping_list.txt"'
+        """Скачать список покупок.
+
+        Параметр `format` выбирает формат файла: txt (по умолчанию), csv
+        или pdf. С параметром `async=true` не ждёт Celery, а сразу
+        возвращает 202 с id задачи. Без него ждёт результат не дольше
+        `SHOPPING_LIST_SYNC_WAIT` секунд (чтобы не занимать воркер),
+        после чего тоже отвечает 202 со ссылкой на статус задачи.
+        """
+        export_format = request.query_params.get("format", "txt").lower()
+        if export_format not in EXPORT_FORMATS:
+            return Response(
+                {"format": f"Доступные форматы: {', '.join(EXPORT_FORMATS)}."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        export_file = get_cached_shopping_list(request.user.id, export_format)
+        is_async = request.query_params.get("async", "").lower() in TRUE_VALUES
+        if export_file and not is_async:
+            return self.shopping_list_response(request, export_file)
+
+        task = generate_shopping_list.delay(request.user.id, export_format)
+        if not is_async:
+            try:
+                return self.shopping_list_response(
+                    request,
+                    task.get(timeout=settings.SHOPPING_LIST_SYNC_WAIT),
+                )
+            except CeleryTimeoutError:
+                pass
+        return self.shopping_list_job_response(request, task)
+
+    @action(
+        detail=False,
+        url_path=r"download_shopping_cart/(?P<job_id>[\w-]+)",
+        permission_classes=(IsAuthenticated,),
+    )
+    def shopping_cart_job(self, request, job_id):
+        """Статус задачи формирования списка покупок или сам файл.
+
+        Параметр `wait` задаёт короткий long-poll в секундах. Пока задача
+        выполняется — 202, после сбоя — 200 со статусом FAILURE.
+        """
+        owner_id = cache.get(SHOPPING_LIST_JOB_KEY.format(job_id))
+        if owner_id != request.user.id:
+            return Response(
+                {"detail": "Задача не найдена."},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+
+        task = AsyncResult(job_id)
+        wait = request.query_params.get("wait", "0")
+        wait = min(
+            int(wait) if wait.isdigit() else 0,
+            settings.SHOPPING_LIST_LONG_POLL_MAX,
         )
-        return response
+        if wait and not task.ready():
+            try:
+                task.get(timeout=wait, propagate=False)
+            except CeleryTimeoutError:
+                pass
+
+        if task.failed():
+            # Сам запрос статуса выполнен успешно: 5xx остаются для
+            # ошибок его обработки, а сбой задачи передаётся в теле.
+            return Response(
+                {"job_id": job_id, "status": task.status,
+                 "detail": "Не удалось сформировать список покупок."},
+                status=status.HTTP_200_OK,
+            )
+        if not task.successful():
+            return Response(
+                {"job_id": job_id, "status": task.status},
+                status=status.HTTP_202_ACCEPTED,
+            )
+        return self.shopping_list_response(request, task.result)
 
     @action(detail=True, url_path="get-link")
     def get_link(self, request, pk=None):
@@ -98,6 +259,70 @@ class RecipeViewSet(CreateDeleteMixin, ModelViewSet):
         """Удалить рецепт из корзины покупок."""
         return self.delete_item(ShoppingList, user=request.user, recipe=pk)
 
+    def get_recipe_ids(self, request):
+        """Проверенный список id из тела `{"recipes": [...]}`."""
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data["recipes"]
+
+    @action(
+        detail=False,
+        methods=("post",),
+        url_path="favorite",
+        permission_classes=(IsAuthenticated,),
+    )
+    def bulk_favorite(self, request):
+        """Добавить несколько рецептов в избранное."""
+        return self.bulk_create_items(
+            Favorite, request.user, self.get_recipe_ids(request)
+        )
+
+    @bulk_favorite.mapping.delete
+    def bulk_unfavorite(self, request):
+        """Удалить несколько рецептов из избранного."""
+        return self.bulk_delete_items(
+            Favorite, request.user, self.get_recipe_ids(request)
+        )
+
+    @action(
+        detail=False,
+        methods=("delete",),
+        url_path="favorite/clear",
+        permission_classes=(IsAuthenticated,),
+    )
+    def clear_favorites(self, request):
+        """Очистить избранное."""
+        return self.bulk_delete_items(Favorite, request.user)
+
+    @action(
+        detail=False,
+        methods=("post",),
+        url_path="shopping_cart",
+        permission_classes=(IsAuthenticated,),
+    )
+    def bulk_add_to_cart(self, request):
+        """Добавить несколько рецептов в корзину покупок."""
+        return self.bulk_create_items(
+            ShoppingList, request.user, self.get_recipe_ids(request)
+        )
+
+    @bulk_add_to_cart.mapping.delete
+    def bulk_remove_from_cart(self, request):
+        """Удалить несколько рецептов из корзины покупок."""
+        return self.bulk_delete_items(
+            ShoppingList, request.user, self.get_recipe_ids(request)
+        )
+
+    @action(
+        detail=False,
+        methods=("delete",),
+        url_path="shopping_cart/clear",
+        permission_classes=(IsAuthenticated,),
+    )
+    def clear_cart(self, request):
+        """Очистить корзину покупок."""
+        return self.bulk_delete_items(ShoppingList, request.user)
+
 
 def short_link_redirect(request, pk):
     """Перенаправляет с короткой ссылки на страницу рецепта."""
@@ -105,16 +330,29 @@ def short_link_redirect(request, pk):
     return redirect("recipes-detail", pk=recipe.pk)
 
 
-class IngredientViewSet(BaseReadOnlyViewSet):
+class IngredientViewSet(ConditionalGetMixin, BaseReadOnlyViewSet):
     """ViewSet для ингредиентов."""
 
+    conditional_dependencies = (INGREDIENTS,)
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     filterset_class = IngredientFilter
 
+    def list(self, request, *args, **kwargs):
+        """Поиск по началу названия через индекс в памяти процесса.
+
+        Параметр `limit` ограничивает число подсказок.
+        """
+        limit = request.query_params.get("limit", "")
+        return Response(ingredient_index.search(
+            request.query_params.get("name", ""),
+            int(limit) if limit.isdigit() else None,
+        ))
+
 
-class TagViewSet(BaseReadOnlyViewSet):
+class TagViewSet(ConditionalGetMixin, BaseReadOnlyViewSet):
     """ViewSet для тегов."""
 
+    conditional_dependencies = (TAGS,)
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
@@ -1,21 +1,45 @@
 from django.contrib.auth import get_user_model
+from django.db.models import (BooleanField, Count, Exists, OuterRef, Prefetch,
+                              Value)
 from django.shortcuts import get_object_or_404
 from djoser.views import UserViewSet
 from rest_framework import status
 from rest_framework.decorators import action
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
+from api.pagination import PaginationModeMixin
 from api.serializers import (AvatarSerializer, SubscriptionSerializer,
                              UnsubscribeSerializer, UserSubscriptionSerializer)
 from backend.mixins import CreateDeleteMixin
+from recipes.models import Recipe
+from users.models import Subscription
 
 User = get_user_model()
 
 
-class UserSubscribeView(CreateDeleteMixin, UserViewSet):
+class UserSubscribeView(PaginationModeMixin, CreateDeleteMixin, UserViewSet):
     """Кастомный ViewSet для подписок пользователей."""
 
+    cursor_ordering = ('username', 'id')
+
+    def get_queryset(self):
+        """Пользователи с флагом подписки, вычисленным в том же запросе."""
+        queryset = super().get_queryset()
+        user = self.request.user
+        if not user.is_authenticated:
+            return queryset.annotate(
+                is_subscribed=Value(False, output_field=BooleanField())
+            )
+        return queryset.annotate(
+            is_subscribed=Exists(
+                Subscription.objects.filter(
+                    follower=user, following=OuterRef('pk')
+                )
+            )
+        )
+
     def get_serializer_class(self):
         """Возвращает сериализатор в зависимости от действия."""
         if self.action in ('avatar', 'delete_avatar'):
@@ -32,13 +56,37 @@ class UserSubscribeView(CreateDeleteMixin, UserViewSet):
         url_path='subscriptions',
     )
     def subscriptions(self, request):
-        """Возвращает список подписок текущего пользователя."""
-        queryset = request.user.subscriptions.all()
+        """Возвращает список подписок текущего пользователя.
+
+        Авторы, число их рецептов и первые `recipes_limit` рецептов каждого
+        загружаются фиксированным числом запросов: срез в Prefetch Django
+        выполняет через оконную функцию ROW_NUMBER() по автору.
+        """
+        context = {'request': request}
+        recipes_limit = UserSubscriptionSerializer(
+            context=context
+        ).get_recipes_limit()
+        recipes = Recipe.objects.only(
+            'id', 'name', 'image', 'image_variants', 'cooking_time', 'author'
+        )
+        if recipes_limit:
+            recipes = recipes[:recipes_limit]
+        queryset = (
+            User.objects.filter(followers__follower=request.user)
+            .annotate(
+                recipes_count=Count('recipes', distinct=True),
+                is_subscribed=Value(True, output_field=BooleanField()),
+            )
+            .prefetch_related(
+                Prefetch(
+                    'recipes', queryset=recipes, to_attr='limited_recipes'
+                )
+            )
+            .order_by('username', 'id')
+        )
         page = self.paginate_queryset(queryset)
         serializer = UserSubscriptionSerializer(
-            [subscription.following for subscription in page],
-            many=True,
-            context={'request': request},
+            page, many=True, context=context
         )
         return self.get_paginated_response(serializer.data)
 
@@ -78,9 +126,14 @@ class UserSubscribeView(CreateDeleteMixin, UserViewSet):
         methods=('put',),
         url_path='me/avatar',
         permission_classes=(IsAuthenticated,),
+        parser_classes=(JSONParser, MultiPartParser, FormParser),
     )
     def avatar(self, request):
-        """Обновление аватара пользователя."""
+        """Обновление аватара пользователя.
+
+        Аватар передаётся строкой base64 в JSON или файлом в
+        multipart-форме (поле `avatar`).
+        """
         serializer = self.get_serializer(
             instance=request.user,
             data=request.data
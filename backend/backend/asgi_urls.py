@@ -0,0 +1,10 @@
+"""URL-схема ASGI-сервера: асинхронные горячие эндпоинты API, затем
+все обычные маршруты из `backend.urls`."""
+from django.urls import include, path
+
+from backend.urls import urlpatterns as sync_urlpatterns
+
+urlpatterns = [
+    path('api/', include('api.async_urls')),
+    *sync_urlpatterns,
+]
@@ -0,0 +1,151 @@
+"""Асинхронный доступ к кэшу и к версиям зависимостей.
+
+С django-redis команды идут через `redis.asyncio` по тем же ключам и в
+том же формате, что пишет синхронный клиент, поэтому синхронные и
+асинхронные представления пользуются общими записями. С другими бэкендами
+используются async-методы Django (синхронный клиент в пуле потоков).
+Функции `a*` повторяют одноимённые из `backend.cache`.
+"""
+import asyncio
+import weakref
+
+from django.conf import settings
+from django.core.cache import cache
+
+from backend.cache import VERSION_KEY, _now
+
+try:
+    from django_redis.cache import RedisCache
+    from redis import asyncio as aioredis
+except ImportError:
+    RedisCache = None
+
+
+class AsyncCache:
+    """Асинхронная обёртка над кэшем по умолчанию."""
+
+    def __init__(self):
+        # Клиент redis.asyncio привязан к циклу событий, в котором создан.
+        self._clients = weakref.WeakKeyDictionary()
+
+    @property
+    def native(self):
+        return RedisCache is not None and isinstance(cache, RedisCache)
+
+    def _redis(self):
+        loop = asyncio.get_running_loop()
+        if loop not in self._clients:
+            location = settings.CACHES['default']['LOCATION']
+            if isinstance(location, (list, tuple)):
+                location = location[0]
+            self._clients[loop] = aioredis.Redis.from_url(location)
+        return self._clients[loop]
+
+    async def get(self, key):
+        return (await self.get_many([key])).get(key)
+
+    async def get_many(self, keys):
+        keys = list(keys)
+        if not self.native:
+            return await cache.aget_many(keys)
+        if not keys:
+            return {}
+        values = await self._redis().mget(
+            [cache.client.make_key(key) for key in keys]
+        )
+        return {key: cache.client.decode(value)
+                for key, value in zip(keys, values) if value is not None}
+
+    async def set(self, key, value, timeout):
+        await self.set_many({key: value}, timeout)
+
+    async def set_many(self, data, timeout):
+        if not self.native:
+            return await cache.aset_many(data, timeout=timeout)
+        expire = None if timeout is None else int(timeout * 1000)
+        async with self._redis().pipeline(transaction=False) as pipeline:
+            for key, value in data.items():
+                pipeline.set(
+                    cache.client.make_key(key),
+                    cache.client.encode(value),
+                    px=expire,
+                )
+            await pipeline.execute()
+
+    async def add(self, key, value, timeout):
+        if not self.native:
+            return await cache.aadd(key, value, timeout=timeout)
+        return bool(await self._redis().set(
+            cache.client.make_key(key),
+            cache.client.encode(value),
+            nx=True,
+            px=None if timeout is None else int(timeout * 1000),
+        ))
+
+
+async_cache = AsyncCache()
+
+
+async def aget_versions(dependencies):
+    keys = {VERSION_KEY.format(dependency): dependency
+            for dependency in dependencies}
+    if not keys:
+        return {}
+    found = await async_cache.get_many(keys)
+    missing = [key for key in keys if key not in found]
+    if missing:
+        now = _now()
+        for key in missing:
+            await async_cache.add(key, now, timeout=None)
+        found.update(await async_cache.get_many(missing))
+    return {keys[key]: version for key, version in found.items()}
+
+
+async def aget_existing_versions(dependencies):
+    since = _now()
+    keys = {VERSION_KEY.format(dependency): dependency
+            for dependency in dependencies}
+    found = await async_cache.get_many(keys) if keys else {}
+    return {keys[key]: version for key, version in found.items()}, since
+
+
+async def acomplete_versions(dependencies, versions, since):
+    missing = {VERSION_KEY.format(dependency): dependency
+               for dependency in dependencies if dependency not in versions}
+    if not missing:
+        return versions
+    for key in missing:
+        await async_cache.add(key, since, timeout=None)
+    found = await async_cache.get_many(missing)
+    if any(found.get(key) != since for key in missing):
+        return None
+    return {**versions, **{dependency: since
+                           for dependency in missing.values()}}
+
+
+async def aset_dependent(key, value, versions, timeout):
+    await async_cache.set(key, (versions, value), timeout=timeout)
+
+
+async def aget_dependent(key):
+    entry = await async_cache.get(key)
+    if entry is None:
+        return None
+    versions, value = entry
+    if await aget_versions(versions) != versions:
+        return None
+    return value
+
+
+async def aget_many_dependent(keys):
+    entries = await async_cache.get_many(keys)
+    dependencies = set()
+    for versions, _ in entries.values():
+        dependencies.update(versions)
+    current = await aget_versions(dependencies)
+    return {
+        key: value
+        for key, (versions, value) in entries.items()
+        if all(current[dependency] == version
+               for dependency, version in versions.items())
+    }
@@ -0,0 +1,160 @@
+"""Инвалидация кэша по версиям зависимостей.
+
+Каждой зависимости (рецепт, корзина пользователя и т. п.) соответствует
+версия в кэше — время последнего изменения в микросекундах. Запись кэша
+хранит версии своих зависимостей на момент расчёта и считается устаревшей,
+как только хотя бы одна из них изменилась. Поэтому запись рецепта делает
+недействительными ровно те записи, которые от него зависят.
+"""
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+VERSION_KEY = 'version_{}'
+
+SHOPPING_LISTS = 'shopping_lists'
+INGREDIENTS = 'ingredients'
+# Поколения публичного каталога: любое изменение рецептов, тегов
+# или профилей пользователей меняет выдачу списков.
+RECIPES = 'recipes'
+TAGS = 'tags'
+USERS = 'users'
+
+
+def recipe_dependency(recipe_id):
+    """Зависимость от содержимого рецепта."""
+    return f'recipe:{recipe_id}'
+
+
+def recipe_stats_dependency(recipe_id):
+    """Зависимость от счётчиков избранного и корзин рецепта."""
+    return f'recipe_stats:{recipe_id}'
+
+
+def user_dependency(user_id):
+    """Зависимость от профиля пользователя."""
+    return f'user:{user_id}'
+
+
+def subscriptions_dependency(user_id):
+    """Зависимость от подписок пользователя."""
+    return f'subscriptions:{user_id}'
+
+
+def shopping_cart_dependency(user_id):
+    """Зависимость от состава корзины пользователя."""
+    return f'shopping_cart:{user_id}'
+
+
+def _now():
+    return time.time_ns() // 1000
+
+
+def get_versions(dependencies):
+    """Возвращает текущие версии зависимостей, заводя недостающие.
+
+    Версии нужно получать до расчёта значения: тогда изменение, случившееся
+    во время расчёта, сделает сохранённую запись устаревшей.
+    """
+    keys = {VERSION_KEY.format(dependency): dependency
+            for dependency in dependencies}
+    if not keys:
+        return {}
+    found = cache.get_many(keys)
+    missing = [key for key in keys if key not in found]
+    if missing:
+        now = _now()
+        for key in missing:
+            cache.add(key, now, timeout=None)
+        found.update(cache.get_many(missing))
+    return {keys[key]: version for key, version in found.items()}
+
+
+def get_existing_versions(dependencies):
+    """Версии, которые уже есть в кэше, и момент их чтения.
+
+    В отличие от `get_versions` недостающие версии не заводятся: их
+    дописывает `complete_versions` после успешного ответа, поэтому запрос
+    к несуществующему объекту не оставляет в кэше бессрочных ключей.
+    """
+    since = _now()
+    keys = {VERSION_KEY.format(dependency): dependency
+            for dependency in dependencies}
+    found = cache.get_many(keys) if keys else {}
+    return {keys[key]: version for key, version in found.items()}, since
+
+
+def complete_versions(dependencies, versions, since):
+    """Дополняет `versions` недостающими версиями со значением `since`.
+
+    Возвращает None, если недостающую версию за время расчёта завёл или
+    сменил кто-то другой: ответ мог устареть, и кэшировать его нельзя.
+    """
+    missing = {VERSION_KEY.format(dependency): dependency
+               for dependency in dependencies if dependency not in versions}
+    if not missing:
+        return versions
+    for key in missing:
+        cache.add(key, since, timeout=None)
+    found = cache.get_many(missing)
+    if any(found.get(key) != since for key in missing):
+        return None
+    return {**versions, **{dependency: since
+                           for dependency in missing.values()}}
+
+
+def bump(*dependencies):
+    """Меняет версии зависимостей после фиксации текущей транзакции."""
+    def set_versions():
+        now = _now()
+        cache.set_many(
+            {VERSION_KEY.format(dependency): now
+             for dependency in dependencies},
+            timeout=None,
+        )
+
+    if dependencies:
+        transaction.on_commit(set_versions)
+
+
+def set_dependent(key, value, versions, timeout):
+    """Кладёт в кэш значение вместе с версиями его зависимостей."""
+    cache.set(key, (versions, value), timeout=timeout)
+
+
+def get_dependent(key):
+    """Возвращает значение из кэша, если его зависимости не менялись."""
+    entry = cache.get(key)
+    if entry is None:
+        return None
+    versions, value = entry
+    if get_versions(versions) != versions:
+        return None
+    return value
+
+
+def set_many_dependent(entries, timeout):
+    """Кладёт в кэш несколько значений: {key: (value, versions)}."""
+    cache.set_many(
+        {key: (versions, value) for key, (value, versions) in entries.items()},
+        timeout=timeout,
+    )
+
+
+def get_many_dependent(keys):
+    """Возвращает {key: value} для актуальных записей из `keys`.
+
+    Записи и версии всех их зависимостей читаются двумя запросами к кэшу.
+    """
+    entries = cache.get_many(keys)
+    dependencies = set()
+    for versions, _ in entries.values():
+        dependencies.update(versions)
+    current = get_versions(dependencies)
+    return {
+        key: value
+        for key, (versions, value) in entries.items()
+        if all(current[dependency] == version
+               for dependency, version in versions.items())
+    }
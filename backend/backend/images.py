@@ -0,0 +1,118 @@
+"""Производные изображения: миниатюры и современные форматы.
+
+Варианты описываются в `settings.IMAGE_VARIANTS` и сохраняются рядом
+с оригиналом под детерминированными именами
+`<папка>/variants/<имя оригинала>_<вариант>.<формат>`. Описание
+готовых вариантов хранится в JSON-поле модели:
+{'source': <имя оригинала>, <вариант>: {<формат>: <имя файла>}}.
+"""
+import io
+import posixpath
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models import Q
+from PIL import Image, ImageOps, features
+
+FORMAT_OPTIONS = {
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 4},
+    'avif': {'format': 'AVIF', 'quality': 60},
+}
+
+
+def available_formats():
+    """Форматы вариантов, которые умеет кодировать установленный Pillow."""
+    return [
+        image_format for image_format in settings.IMAGE_VARIANT_FORMATS
+        if features.check(image_format)
+    ]
+
+
+def variant_name(source_name, variant, image_format):
+    """Детерминированное имя файла варианта."""
+    folder, filename = posixpath.split(source_name)
+    root = posixpath.splitext(filename)[0]
+    return posixpath.join(
+        folder, 'variants', f'{root}_{variant}.{image_format}'
+    )
+
+
+def resize(image, size, crop):
+    """Обрезает до точного размера или вписывает в него."""
+    if crop:
+        return ImageOps.fit(image, size, Image.Resampling.LANCZOS)
+    image = image.copy()
+    image.thumbnail(size, Image.Resampling.LANCZOS)
+    return image
+
+
+def render_variants(source_name, kind):
+    """Создаёт все варианты изображения и возвращает их описание."""
+    with default_storage.open(source_name) as source:
+        image = ImageOps.exif_transpose(Image.open(source))
+        image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+
+    variants = {'source': source_name}
+    for variant, options in settings.IMAGE_VARIANTS[kind].items():
+        resized = resize(image, options['size'], options.get('crop', False))
+        variants[variant] = {}
+        for image_format in available_formats():
+            buffer = io.BytesIO()
+            resized.save(buffer, **FORMAT_OPTIONS[image_format])
+            name = variant_name(source_name, variant, image_format)
+            if default_storage.exists(name):
+                default_storage.delete(name)
+            variants[variant][image_format] = default_storage.save(
+                name, ContentFile(buffer.getvalue())
+            )
+    return variants
+
+
+def delete_variants(variants):
+    """Удаляет файлы вариантов, перечисленных в описании."""
+    for variant, files in variants.items():
+        if variant == 'source':
+            continue
+        for name in files.values():
+            default_storage.delete(name)
+
+
+def refresh_variants(model, pk, field, variants_field, kind):
+    """Приводит варианты изображения объекта в соответствие с оригиналом.
+
+    Описание сохраняется, только если оригинал не сменился за время
+    обработки. Возвращает True, если описание вариантов изменилось.
+    """
+    instance = model.objects.filter(pk=pk).only(field, variants_field).first()
+    if instance is None:
+        return False
+    source = getattr(instance, field).name or None
+    old_variants = getattr(instance, variants_field)
+    if old_variants.get('source') == source:
+        return False
+
+    variants = render_variants(source, kind) if source else {}
+    unchanged = (
+        Q(**{field: source}) if source
+        else Q(**{f'{field}__isnull': True}) | Q(**{field: ''})
+    )
+    if not model.objects.filter(unchanged, pk=pk).update(
+        **{variants_field: variants}
+    ):
+        delete_variants(variants)
+        return False
+    delete_variants(old_variants)
+    return True
+
+
+def variant_url(field_file, variants, variant):
+    """URL варианта изображения или оригинала, пока варианта нет."""
+    if not field_file:
+        return None
+    if variants.get('source') == field_file.name:
+        files = variants.get(variant, {})
+        for image_format in settings.IMAGE_VARIANT_FORMATS:
+            if image_format in files:
+                return default_storage.url(files[image_format])
+    return field_file.url
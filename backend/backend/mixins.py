@@ -1,27 +1,284 @@
-from django.shortcuts import get_object_or_404
+import hashlib
+import json
+from contextlib import nullcontext
+
+from django.conf import settings
+from django.db import transaction
+from django.http import Http404
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import http_date
 from rest_framework import status
 from rest_framework.response import Response
 
+from backend.cache import (complete_versions, get_dependent,
+                           get_existing_versions, set_dependent)
+from backend.replicas import replica_reads
+from recipes.signals import user_recipes_changed
+
+
+def request_digest(request, *parts):
+    """Хэш хоста, нормализованных параметров запроса и `parts`."""
+    params = sorted(
+        (key, sorted(request.GET.getlist(key))) for key in request.GET
+    )
+    raw = json.dumps(
+        [request.get_host(), *parts, params], ensure_ascii=False
+    )
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def public_cache_key(prefix, request, action, kwargs):
+    """Ключ кэша анонимного ответа: хост, действие и параметры запроса."""
+    digest = request_digest(request, action, kwargs)
+    return f'public_response_{prefix}_{digest}'
+
+
+def conditional_validators(request, action, kwargs, versions, user_id=None,
+                           media_format='json'):
+    """Слабый ETag и Last-Modified ответа по версиям его зависимостей.
+
+    Тело ответа не нужно: ETag меняется вместе с любой из версий, а
+    Last-Modified — время самого свежего изменения, в секундах.
+    """
+    digest = request_digest(
+        request, action, kwargs, media_format, user_id,
+        sorted(versions.items()),
+    )
+    return f'W/"{digest}"', max(versions.values()) // 1_000_000
+
+
+def set_conditional_headers(response, etag, last_modified, per_user=False):
+    """Валидаторы и `no-cache`: клиент перепроверяет ответ каждый раз."""
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    if per_user:
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ('Authorization',))
+    else:
+        patch_cache_control(response, no_cache=True)
+
 
 class CreateDeleteMixin:
     """Миксин для добавления и удаления объектов (избранное, корзина)."""
 
+    @staticmethod
+    def changes_atomic(model):
+        """Транзакция, если изменения модели кто-то обрабатывает.
+
+        Связь и счётчик рецепта меняются одной инструкцией (см.
+        `UserRecipeQuerySet`). У избранного нет получателей
+        `user_recipes_changed`, поэтому переключение — одно обращение к
+        базе без BEGIN/COMMIT. У корзины получатель обновляет агрегат
+        списка покупок отдельным запросом, и оба запроса идут в одной
+        транзакции: BEGIN, изменение связи, агрегат, COMMIT.
+        """
+        if user_recipes_changed.has_listeners(model):
+            return transaction.atomic()
+        return nullcontext()
+
     def create_item(self, model, serializer_class, data, request):
-        """Создает объект, если его еще нет."""
+        """Создает объект, если его еще нет.
+
+        Проверка и вставка выполняются одним INSERT ... ON CONFLICT,
+        поэтому одновременные запросы не приводят к IntegrityError.
+        """
         user_id = data.get('user')
         recipe_id = data.get('recipe')
-
-        if model.objects.filter(user_id=user_id, recipe_id=recipe_id).exists():
+        if not str(recipe_id).isdigit():
+            found = added = []
+        else:
+            with self.changes_atomic(model):
+                found, added = model.objects.add(user_id, [int(recipe_id)])
+                user_recipes_changed.send(
+                    sender=model, user_id=user_id, added=added, removed=[]
+                )
+        if not found:
+            return Response(
+                {'recipe': [f'Недопустимый первичный ключ "{recipe_id}" - '
+                            f'объект не существует.']},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if not added:
             return Response({'detail': 'Уже добавлено.'},
                             status=status.HTTP_200_OK)
 
-        serializer = serializer_class(data=data, context={'request': request})
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
+        serializer = serializer_class(
+            model(user_id=user_id, recipe_id=added[0]),
+            context={'request': request},
+        )
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-    def delete_item(self, model, **kwargs):
-        """Удаляет объект модели."""
-        obj = get_object_or_404(model, **kwargs)
-        obj.delete()
+    def delete_item(self, model, user, recipe):
+        """Удаляет объект модели одним DELETE ... RETURNING."""
+        if not str(recipe).isdigit():
+            raise Http404
+        with self.changes_atomic(model):
+            removed = model.objects.remove(user.id, [int(recipe)])
+            user_recipes_changed.send(
+                sender=model, user_id=user.id, added=[], removed=removed
+            )
+        if not removed:
+            raise Http404
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    def bulk_create_items(self, model, user, recipe_ids):
+        """Добавляет пачку рецептов одним INSERT, пропуская уже добавленные.
+
+        Сигналы строк не отправляются: изменения применяются одним
+        `user_recipes_changed` на всю пачку.
+        """
+        with self.changes_atomic(model):
+            _, added = model.objects.add(user.id, recipe_ids)
+            user_recipes_changed.send(
+                sender=model, user_id=user.id, added=added, removed=[]
+            )
+        added.sort(key=recipe_ids.index)
+        return Response({'recipes': added}, status=status.HTTP_201_CREATED)
+
+    def bulk_delete_items(self, model, user, recipe_ids=None):
+        """Удаляет рецепты пользователя одним DELETE; без id — все."""
+        with self.changes_atomic(model):
+            removed = model.objects.remove(user.id, recipe_ids)
+            user_recipes_changed.send(
+                sender=model, user_id=user.id, added=[], removed=removed
+            )
         return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class PublicResponseCacheMixin:
+    """Кэширует ответы list и retrieve для анонимных пользователей.
+
+    Анонимы получают одинаковые данные, поэтому ответ хранится в кэше
+    по нормализованным параметрам запроса и живёт, пока не изменились
+    его зависимости (см. `get_cache_dependencies`).
+    """
+
+    public_cache_prefix = None
+
+    def get_cache_dependencies(self):
+        """Зависимости закэшированного ответа текущего действия."""
+        return ()
+
+    def get_public_cache_key(self, request):
+        return public_cache_key(
+            self.public_cache_prefix, request, self.action, self.kwargs
+        )
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return handler(request, *args, **kwargs)
+        key = self.get_public_cache_key(request)
+        data = get_dependent(key)
+        if data is not None:
+            return Response(data)
+
+        dependencies = self.get_cache_dependencies()
+        versions, since = get_existing_versions(dependencies)
+        # Кэш живёт до следующей смены версий, поэтому ответ для него
+        # читается с primary: отставшая реплика сохранила бы под новыми
+        # версиями старые данные.
+        with replica_reads(False):
+            response = handler(request, *args, **kwargs)
+        if response.status_code != status.HTTP_200_OK:
+            return response
+        versions = complete_versions(dependencies, versions, since)
+        if versions is not None:
+            set_dependent(
+                key,
+                response.data,
+                versions,
+                timeout=settings.PUBLIC_RESPONSE_CACHE_TIMEOUT,
+            )
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+
+class NotModified(Exception):
+    """Ответ 304, найденный до выполнения действия."""
+
+    def __init__(self, response):
+        super().__init__()
+        self.response = response
+
+
+class ConditionalGetMixin:
+    """Условные GET для list и retrieve по версиям зависимостей.
+
+    ETag и Last-Modified считаются из версий `conditional_dependencies` в
+    кэше сразу после аутентификации и проверки прав, поэтому совпавший
+    `If-None-Match` получает 304 без запросов к базе и сериализации. Если
+    ответ зависит от пользователя, в ETag входит его id
+    (`conditional_per_user`). Если каких-то версий в кэше ещё нет,
+    валидаторы считаются после ответа и только при статусе 200: запрос
+    несуществующего объекта не заводит для него версий. Если недостающую
+    версию за это время завёл другой код, ответ уходит без валидаторов.
+    """
+
+    conditional_dependencies = ()
+    conditional_per_user = False
+
+    def get_conditional_dependencies(self):
+        """Зависимости ответа текущего действия; пусто — без валидаторов."""
+        if self.action not in ('list', 'retrieve'):
+            return ()
+        return self.conditional_dependencies
+
+    def get_conditional_validators(self, request, versions):
+        return conditional_validators(
+            request,
+            self.action,
+            self.kwargs,
+            versions,
+            request.user.pk if self.conditional_per_user else None,
+            request.accepted_renderer.format,
+        )
+
+    def initial(self, request, *args, **kwargs):
+        self.conditional = self.conditional_pending = None
+        super().initial(request, *args, **kwargs)
+        if request.method not in ('GET', 'HEAD'):
+            return
+        dependencies = self.get_conditional_dependencies()
+        if not dependencies:
+            return
+        versions, since = get_existing_versions(dependencies)
+        if set(dependencies) - versions.keys():
+            # С версиями, которых ещё нет, ETag клиента совпасть не может.
+            self.conditional_pending = dependencies, versions, since
+            return
+        self.conditional = self.get_conditional_validators(request, versions)
+        response = get_conditional_response(request, *self.conditional)
+        if response is not None:
+            raise NotModified(response)
+
+    def handle_exception(self, exc):
+        if isinstance(exc, NotModified):
+            return exc.response
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(
+            request, response, *args, **kwargs
+        )
+        if (getattr(self, 'conditional_pending', None)
+                and response.status_code == status.HTTP_200_OK):
+            versions = complete_versions(*self.conditional_pending)
+            if versions is not None:
+                self.conditional = self.get_conditional_validators(
+                    request, versions
+                )
+        if (getattr(self, 'conditional', None)
+                and response.status_code in (status.HTTP_200_OK,
+                                             status.HTTP_304_NOT_MODIFIED)):
+            set_conditional_headers(
+                response, *self.conditional, self.conditional_per_user
+            )
+        return response
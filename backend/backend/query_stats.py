@@ -0,0 +1,136 @@
+"""Статистика SQL-запросов: число, суммарное время и повторы.
+
+`QueryStats` подключается ко всем соединениям через `execute_wrapper` и
+собирает запросы внутри блока `with`. `QueryStatsMiddleware` включается
+настройкой `QUERY_STATS` (по умолчанию вместе с DEBUG), отдаёт итог по
+каждому HTTP-запросу в заголовках ответа и пишет в лог запросы, которые
+повторились больше `QUERY_STATS_REPEAT_LIMIT` раз, — признак N+1.
+"""
+import logging
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+class QueryStats:
+    """Запросы к базе, выполненные внутри блока `with`."""
+
+    def __init__(self):
+        self.queries = []
+        self._stack = None
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for connection in connections.all():
+            self._stack.enter_context(
+                connection.execute_wrapper(self._wrapper(connection.alias))
+            )
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+
+    def _wrapper(self, alias):
+        def wrapper(execute, sql, params, many, context):
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                self.queries.append((
+                    alias,
+                    sql,
+                    repr(params),
+                    (time.perf_counter() - started) * 1000,
+                ))
+        return wrapper
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def duration(self):
+        """Суммарное время запросов, мс."""
+        return sum(query[3] for query in self.queries)
+
+    @property
+    def duplicates(self):
+        """Запросы, полностью повторяющие уже выполненные (SQL и параметры)."""
+        return self.count - len(
+            {(alias, sql, params) for alias, sql, params, _ in self.queries}
+        )
+
+    @property
+    def repeated(self):
+        """Запросы с уже встречавшимся текстом SQL — типичный след N+1."""
+        return self.count - len({sql for _, sql, _, _ in self.queries})
+
+    def most_repeated(self, limit=3):
+        """[(sql, сколько раз)] для самых частых текстов запросов."""
+        return [
+            (sql, times)
+            for sql, times in Counter(
+                sql for _, sql, _, _ in self.queries
+            ).most_common(limit)
+            if times > 1
+        ]
+
+    def headers(self):
+        return {
+            'X-Query-Count': str(self.count),
+            'X-Query-Time': f'{self.duration:.1f}',
+            'X-Query-Duplicates': str(self.duplicates),
+            'X-Query-Repeated': str(self.repeated),
+            'Server-Timing': (
+                f'db;dur={self.duration:.1f};desc="{self.count} SQL"'
+            ),
+        }
+
+    def report(self):
+        """Нумерованный список запросов для сообщений об ошибках."""
+        return '\n'.join(
+            f'{number}. [{alias}] {duration:.2f} мс: {sql} {params}'
+            for number, (alias, sql, params, duration)
+            in enumerate(self.queries, 1)
+        )
+
+
+class QueryStatsMiddleware:
+    """Заголовки X-Query-* и Server-Timing со статистикой SQL запроса.
+
+    Только синхронная: под ASGI Django выполняет её в потоке, и запросы
+    асинхронных представлений через `sync_to_async` попадают в тот же
+    поток. Поэтому включать её стоит для отладки и замеров, а не в
+    production.
+    """
+
+    def __init__(self, get_response):
+        if not settings.QUERY_STATS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with QueryStats() as stats:
+            response = self.get_response(request)
+        for header, value in stats.headers().items():
+            response[header] = value
+        repeated = [
+            (sql, times) for sql, times in stats.most_repeated()
+            if times > settings.QUERY_STATS_REPEAT_LIMIT
+        ]
+        if repeated:
+            logger.warning(
+                '%s %s: %d SQL-запросов за %.1f мс, повторы: %s',
+                request.method,
+                request.get_full_path(),
+                stats.count,
+                stats.duration,
+                '; '.join(f'{times}× {sql}' for sql, times in repeated),
+            )
+        return response
@@ -0,0 +1,126 @@
+"""Чтение с реплик PostgreSQL с закреплением пишущих клиентов за primary.
+
+Реплики перечислены в `settings.DATABASE_REPLICAS`. Безопасные запросы
+(GET, HEAD, OPTIONS) читают с реплики, запросы с записью, транзакции и
+фоновые задачи по умолчанию работают с primary. После записи клиент
+закрепляется за primary на `DATABASE_REPLICA_PIN_TIMEOUT` секунд, чтобы
+сразу видеть свои изменения (избранное, корзину), пока реплика догоняет.
+Всё, что попадает в кэш с версиями (ответы анонимам, фрагменты рецептов,
+файлы списков покупок, счётчики страниц, индекс ингредиентов), читается
+с primary через `replica_reads(False)`: запись с отставшей реплики
+считалась бы актуальной до следующей смены версий.
+"""
+import hashlib
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from backend.async_cache import async_cache
+
+REPLICA_PIN_KEY = 'db_replica_pin_{}'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+# Только что выданный токен или сессия могут ещё не дойти до реплики.
+PRIMARY_MODELS = {'authtoken.token', 'sessions.session'}
+
+_use_replicas = ContextVar('use_replicas', default=False)
+
+
+def replica_reads_enabled():
+    """Читает ли текущий запрос или задача с реплик."""
+    return _use_replicas.get() and bool(settings.DATABASE_REPLICAS)
+
+
+@contextmanager
+def replica_reads(enabled=True):
+    """Включает (или выключает) чтение с реплик внутри блока."""
+    token = _use_replicas.set(enabled)
+    try:
+        yield
+    finally:
+        _use_replicas.reset(token)
+
+
+class ReplicaRouter:
+    """Роутер: запись и миграции — primary, чтение — случайная реплика."""
+
+    def db_for_read(self, model, **hints):
+        if (not replica_reads_enabled()
+                or model._meta.label_lower in PRIMARY_MODELS
+                or connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return DEFAULT_DB_ALIAS
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS
+
+
+def pin_key(request):
+    """Ключ закрепления клиента: хэш токена или cookie сессии."""
+    credentials = (
+        request.META.get('HTTP_AUTHORIZATION')
+        or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    )
+    if not credentials:
+        return None
+    return REPLICA_PIN_KEY.format(
+        hashlib.sha256(credentials.encode()).hexdigest()
+    )
+
+
+class ReplicaMiddleware:
+    """Направляет чтение безопасных запросов на реплики.
+
+    Запрос с записью закрепляет клиента за primary; пока закрепление
+    действует, его запросы на чтение тоже идут на primary. Работает и в
+    синхронном, и в асинхронном стеке: флаг хранится в contextvar, который
+    asgiref копирует в потоки синхронного кода.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+        key = pin_key(request)
+        if request.method not in SAFE_METHODS:
+            response = self.get_response(request)
+            if key:
+                cache.set(
+                    key, True, timeout=settings.DATABASE_REPLICA_PIN_TIMEOUT
+                )
+            return response
+        with replica_reads(not (key and cache.get(key))):
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return await self.get_response(request)
+        key = pin_key(request)
+        if request.method not in SAFE_METHODS:
+            response = await self.get_response(request)
+            if key:
+                await async_cache.set(
+                    key, True, timeout=settings.DATABASE_REPLICA_PIN_TIMEOUT
+                )
+            return response
+        with replica_reads(not (key and await async_cache.get(key))):
+            return await self.get_response(request)
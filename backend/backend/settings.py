@@ -23,6 +23,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'django_extensions',
     'rest_framework',
     'rest_framework.authtoken',
@@ -34,7 +35,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'backend.query_stats.QueryStatsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'backend.replicas.ReplicaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -43,7 +46,11 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-ROOT_URLCONF = 'backend.urls'
+# Статистика SQL в заголовках ответов (backend/query_stats.py).
+QUERY_STATS = os.getenv('QUERY_STATS', str(DEBUG)).lower() == 'true'
+QUERY_STATS_REPEAT_LIMIT = int(os.getenv('QUERY_STATS_REPEAT_LIMIT', 3))
+
+ROOT_URLCONF = os.getenv('DJANGO_ROOT_URLCONF', 'backend.urls')
 
 TEMPLATES = [
     {
@@ -71,9 +78,46 @@ DATABASES = {
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', 'foodgram_password'),
         'HOST': os.getenv('DB_HOST', 'db'),
         'PORT': os.getenv('DB_PORT', 5432),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Пул соединений psycopg 3 в каждом процессе. Размеры задаются отдельно
+# для веб-сервера и воркеров Celery (переменные сервисов в
+# docker-compose). С DB_POOL=false вместо пула — постоянные соединения
+# на DB_CONN_MAX_AGE секунд; проверку перед использованием в обоих
+# режимах включает CONN_HEALTH_CHECKS.
+if os.getenv('DB_POOL', 'true').lower() == 'true':
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': int(os.getenv('DB_POOL_MIN_SIZE', 1)),
+            'max_size': int(os.getenv('DB_POOL_MAX_SIZE', 4)),
+            'timeout': float(os.getenv('DB_POOL_TIMEOUT', 10)),
+        },
+    }
+else:
+    DATABASES['default']['CONN_MAX_AGE'] = int(
+        os.getenv('DB_CONN_MAX_AGE', 60)
+    )
+
+# Реплики только для чтения: DB_REPLICA_HOSTS=host[:port],... Для проверки
+# без репликации можно указать хост самого primary (второй алиас той же
+# базы). Роутер и middleware — в backend/replicas.py.
+DATABASE_REPLICAS = []
+for number, address in enumerate(
+    filter(None, os.getenv('DB_REPLICA_HOSTS', '').split(','))
+):
+    host, _, port = address.strip().partition(':')
+    DATABASES[f'replica_{number}'] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': port or DATABASES['default']['PORT'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica_{number}')
+DATABASE_ROUTERS = ['backend.replicas.ReplicaRouter']
+DATABASE_REPLICA_PIN_TIMEOUT = int(os.getenv('DB_REPLICA_PIN_TIMEOUT', 10))
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -102,6 +146,45 @@ STATIC_ROOT = BASE_DIR / 'collected_static'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Файлы списков покупок лежат вне MEDIA_ROOT: nginx их не раздаёт,
+# скачать список можно только через API его владельцем.
+SHOPPING_LIST_EXPORT_ROOT = os.getenv(
+    'SHOPPING_LIST_EXPORT_ROOT', str(BASE_DIR / 'exports')
+)
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+    'shopping_lists': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+        'OPTIONS': {'location': SHOPPING_LIST_EXPORT_ROOT},
+    },
+}
+
+# Производные изображения (см. backend/images.py). Форматы перечислены
+# в порядке предпочтения; AVIF пропускается, если его не умеет Pillow.
+IMAGE_VARIANT_FORMATS = ('webp', 'avif')
+IMAGE_VARIANTS = {
+    'recipe': {
+        'card': {'size': (480, 480), 'crop': True},
+        'large': {'size': (1280, 1280)},
+    },
+    'avatar': {
+        'small': {'size': (128, 128), 'crop': True},
+    },
+}
+
+# Загружаемые файлы сразу пишутся во временный файл, а не в память
+# процесса. Размеры изображений проверяются по заголовку.
+FILE_UPLOAD_HANDLERS = [
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+IMAGE_UPLOAD_MAX_SIDE = 8000
+IMAGE_UPLOAD_MAX_PIXELS = 40_000_000
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 AUTH_USER_MODEL = 'users.User'
 
@@ -120,6 +203,11 @@ REST_FRAMEWORK = {
     ],
 }
 
+PAGINATION_COUNT_TIMEOUT = 60
+PUBLIC_RESPONSE_CACHE_TIMEOUT = 300
+RECIPE_FRAGMENT_CACHE_TIMEOUT = 60 * 60
+BULK_RECIPES_MAX = 100
+
 DJOSER = {
     'HIDE_USERS': False,
     'LOGIN_FIELD': 'email',
@@ -181,6 +269,33 @@ CELERY_ACCEPT_CONTENT = ['application/json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
+CELERY_BEAT_SCHEDULE = {
+    'reconcile-recipe-counters': {
+        'task': 'recipes.tasks.reconcile_recipe_counters',
+        'schedule': int(os.getenv('RECIPE_COUNTERS_RECONCILE_INTERVAL', 3600)),
+    },
+    'delete-stale-shopping-lists': {
+        'task': 'recipes.tasks.delete_stale_shopping_lists',
+        'schedule': int(os.getenv('SHOPPING_LIST_CLEANUP_INTERVAL', 3600)),
+    },
+}
+
+SHOPPING_LIST_CACHE_TIMEOUT = 300
+SHOPPING_LIST_JOB_TIMEOUT = 600
+# Сколько download_shopping_cart ждёт файл, прежде чем ответить 202:
+# ожидание держит воркер gunicorn, поэтому оно короткое. Дольше (до
+# SHOPPING_LIST_LONG_POLL_MAX) можно ждать на адресе статуса задачи.
+SHOPPING_LIST_SYNC_WAIT = float(os.getenv('SHOPPING_LIST_SYNC_WAIT', 2))
+SHOPPING_LIST_LONG_POLL_MAX = 10
+# Файл живёт дольше записи кэша и задачи, которые на него ссылаются.
+SHOPPING_LIST_EXPORT_MAX_AGE = int(
+    os.getenv('SHOPPING_LIST_EXPORT_MAX_AGE', 24 * 60 * 60)
+)
+# Каталог в MEDIA_ROOT, где файлы лежали раньше; его очищает та же задача.
+SHOPPING_LIST_LEGACY_DIR = 'shopping_lists'
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    'SHOPPING_LIST_PDF_FONT', '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
 
 
 FORBIDDEN_USERNAMES = ['me', 'admin', 'superuser']
@@ -3,6 +3,7 @@ from django.contrib.admin import register
 
 from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
                             ShoppingList, Tag)
+from recipes.signals import recipe_ingredients_changed
 
 admin.site.register(Favorite)
 admin.site.register(ShoppingList)
@@ -26,15 +27,29 @@ class RecipeIngredientInline(admin.TabularInline):
 class RecipeAdmin(admin.ModelAdmin):
     """Админ-панель для модели Recipe."""
 
-    list_display = ('id', 'name', 'author', 'cooking_time', 'favorites_count')
+    list_display = (
+        'id', 'name', 'author', 'cooking_time',
+        'favorites_count', 'in_carts_count',
+    )
+    readonly_fields = ('favorites_count', 'in_carts_count')
     search_fields = ('name', 'author')
     list_filter = ('author', 'name')
     inlines = (RecipeIngredientInline,)
 
-    @admin.display(description='Счётчик избранного')
-    def favorites_count(self, recipe):
-        """Количество добавлений рецепта в избранное."""
-        return recipe.favorite.count()
+    def save_related(self, request, form, formsets, change):
+        """Сохраняет инлайны и обновляет списки покупок с рецептом."""
+        recipe = form.instance
+        old_amounts = (
+            dict(recipe.recipes.values_list('ingredient_id', 'amount'))
+            if change else {}
+        )
+        super().save_related(request, form, formsets, change)
+        recipe_ingredients_changed.send(
+            sender=Recipe,
+            recipe=recipe,
+            old=old_amounts,
+            new=dict(recipe.recipes.values_list('ingredient_id', 'amount')),
+        )
 
 
 @register(Ingredient)
@@ -0,0 +1,93 @@
+"""Общие части нагрузочных команд `bench_http` и `bench_api`.
+
+Клиенты — потоки с постоянным HTTP-соединением (keep-alive) на поток,
+как у браузера или мобильного приложения. Задержки считаются в
+миллисекундах от отправки запроса до прочтения всего ответа.
+"""
+import http.client
+import json
+import statistics
+import threading
+import time
+from urllib.parse import quote, urlsplit
+
+# Кириллица в путях вроде `?name=мол` кодируется, уже закодированное — нет.
+URL_SAFE = "/?&=%:+,;@!$'()*~"
+
+
+class HttpClient:
+    """Постоянное соединение с сервером; переподключается после ошибки."""
+
+    def __init__(self, url, headers=None, timeout=30):
+        target = urlsplit(url)
+        self.host = target.hostname
+        self.port = target.port or 80
+        self.prefix = target.path.rstrip('/')
+        self.headers = headers or {}
+        self.timeout = timeout
+        self.connection = None
+
+    def request(self, method, path, data=None, headers=None):
+        """Возвращает (статус, задержка в мс, тело); статус 0 — сбой сети."""
+        body = None
+        headers = {**self.headers, **(headers or {})}
+        if data is not None:
+            body = json.dumps(data).encode()
+            headers['Content-Type'] = 'application/json'
+        if self.connection is None:
+            self.connection = http.client.HTTPConnection(
+                self.host, self.port, timeout=self.timeout
+            )
+        started = time.perf_counter()
+        try:
+            self.connection.request(
+                method,
+                quote(self.prefix + path, safe=URL_SAFE),
+                body=body,
+                headers=headers,
+            )
+            response = self.connection.getresponse()
+            content = response.read()
+        except (OSError, http.client.HTTPException):
+            self.close()
+            return 0, (time.perf_counter() - started) * 1000, b''
+        return (
+            response.status, (time.perf_counter() - started) * 1000, content
+        )
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+def run_workers(concurrency, duration, worker):
+    """Запускает `worker(номер, дедлайн)` в `concurrency` потоках.
+
+    Возвращает фактическую длительность прогона в секундах.
+    """
+    started = time.perf_counter()
+    deadline = started + duration
+    threads = [
+        threading.Thread(target=worker, args=(number, deadline))
+        for number in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started
+
+
+def latency_summary(timings):
+    """Среднее, перцентили и максимум задержек, мс."""
+    if len(timings) < 2:
+        return None
+    percentiles = statistics.quantiles(timings, n=100)
+    return {
+        'mean': round(statistics.mean(timings), 3),
+        'p50': round(percentiles[49], 3),
+        'p95': round(percentiles[94], 3),
+        'p99': round(percentiles[98], 3),
+        'max': round(max(timings), 3),
+    }
@@ -0,0 +1,82 @@
+import csv
+import io
+import logging
+import os
+from collections import namedtuple
+
+from django.conf import settings
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+logger = logging.getLogger(__name__)
+
+EMPTY_SHOPPING_LIST = 'Список покупок пуст'
+PDF_FONT_NAME = 'ShoppingListFont'
+
+ExportFormat = namedtuple('ExportFormat', ('content_type', 'render'))
+
+
+def render_txt(rows):
+    """Список покупок в виде текста, по ингредиенту на строку."""
+    lines = [
+        f"{row['name']} ({row['unit']}) — {row['total_amount']}"
+        for row in rows
+    ]
+    return ('\n'.join(lines) or EMPTY_SHOPPING_LIST).encode()
+
+
+def render_csv(rows):
+    """Список покупок в CSV (с BOM, чтобы Excel понял кодировку)."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(('Ингредиент', 'Единица измерения', 'Количество'))
+    writer.writerows(
+        (row['name'], row['unit'], row['total_amount']) for row in rows
+    )
+    return buffer.getvalue().encode('utf-8-sig')
+
+
+def get_pdf_font():
+    """Регистрирует шрифт с кириллицей; без него — встроенный Helvetica."""
+    if PDF_FONT_NAME in pdfmetrics.getRegisteredFontNames():
+        return PDF_FONT_NAME
+    font_path = settings.SHOPPING_LIST_PDF_FONT
+    if not os.path.exists(font_path):
+        logger.warning('Шрифт для PDF не найден: %s', font_path)
+        return 'Helvetica'
+    pdfmetrics.registerFont(TTFont(PDF_FONT_NAME, font_path))
+    return PDF_FONT_NAME
+
+
+def render_pdf(rows):
+    """Список покупок в PDF, разбитый на страницы A4."""
+    buffer = io.BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=A4, invariant=True)
+    font = get_pdf_font()
+    width, height = A4
+    margin, line_height = 50, 18
+    lines = render_txt(rows).decode().split('\n')
+
+    y = height - margin
+    pdf.setFont(font, 16)
+    pdf.drawString(margin, y, 'Список покупок')
+    y -= 2 * line_height
+    pdf.setFont(font, 12)
+    for line in lines:
+        if y < margin:
+            pdf.showPage()
+            pdf.setFont(font, 12)
+            y = height - margin
+        pdf.drawString(margin, y, line)
+        y -= line_height
+    pdf.save()
+    return buffer.getvalue()
+
+
+EXPORT_FORMATS = {
+    'txt': ExportFormat('text/plain; charset=utf-8', render_txt),
+    'csv': ExportFormat('text/csv; charset=utf-8', render_csv),
+    'pdf': ExportFormat('application/pdf', render_pdf),
+}
@@ -0,0 +1,79 @@
+import threading
+from bisect import bisect_left
+
+from asgiref.sync import sync_to_async
+
+from backend.async_cache import aget_versions
+from backend.cache import INGREDIENTS, get_versions
+from backend.replicas import replica_reads
+from recipes.models import Ingredient
+
+# Символ больше любого другого: верхняя граница диапазона префикса.
+MAX_CHAR = chr(0x10FFFF)
+
+
+class IngredientPrefixIndex:
+    """Префиксный индекс названий ингредиентов в памяти процесса.
+
+    Хранит отсортированный массив названий в casefold и параллельный массив
+    строк (id, name, measurement_unit); поиск по префиксу — два bisect.
+    Индекс перезагружается, когда меняется версия каталога в кэше.
+    """
+
+    def __init__(self):
+        self._data = (None, [], [])
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """Перечитывает каталог, если его версия изменилась."""
+        self.load(get_versions((INGREDIENTS,))[INGREDIENTS])
+
+    async def arefresh(self):
+        """Асинхронный `refresh`: версия читается без потока."""
+        version = (await aget_versions((INGREDIENTS,)))[INGREDIENTS]
+        if self._data[0] != version:
+            await sync_to_async(self.load)(version)
+
+    def load(self, version):
+        """Загружает каталог, если индекс построен не для `version`."""
+        if self._data[0] == version:
+            return
+        with self._lock:
+            if self._data[0] == version:
+                return
+            # Индекс живёт до смены версии: читаем только с primary.
+            with replica_reads(False):
+                rows = sorted(
+                    Ingredient.objects.values_list(
+                        'id', 'name', 'measurement_unit'
+                    ),
+                    key=lambda row: (row[1].casefold(), row[0]),
+                )
+            keys = [name.casefold() for _, name, _ in rows]
+            self._data = (version, keys, rows)
+
+    def search(self, prefix, limit=None):
+        """Ингредиенты, название которых начинается с `prefix`."""
+        self.refresh()
+        return self.lookup(prefix, limit)
+
+    async def asearch(self, prefix, limit=None):
+        """Асинхронный `search`."""
+        await self.arefresh()
+        return self.lookup(prefix, limit)
+
+    def lookup(self, prefix, limit=None):
+        """Поиск по уже загруженному индексу."""
+        _, keys, rows = self._data
+        prefix = prefix.casefold()
+        start = bisect_left(keys, prefix)
+        end = bisect_left(keys, prefix + MAX_CHAR, lo=start)
+        if limit is not None:
+            end = min(end, start + limit)
+        return [
+            {'id': pk, 'name': name, 'measurement_unit': unit}
+            for pk, name, unit in rows[start:end]
+        ]
+
+
+ingredient_index = IngredientPrefixIndex()
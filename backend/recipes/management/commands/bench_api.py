@@ -0,0 +1,354 @@
+import json
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+from urllib.parse import urlencode
+
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.benchmark import HttpClient, latency_summary, run_workers
+
+READ_OPERATIONS = {
+    'recipes_list': 30,
+    'recipes_filtered': 20,
+    'recipe_detail': 25,
+    'subscriptions': 10,
+    'download_shopping_cart': 5,
+}
+WRITE_OPERATIONS = {
+    'favorite_toggle': 40,
+    'cart_toggle': 40,
+    'subscribe_toggle': 20,
+}
+PAGE_LIMITS = (6, 10, 20)
+MAX_PAGE = 10
+
+
+class ApiWorker:
+    """Клиент прогона: свои пользователи, соединение и состояние связей.
+
+    Каждый поток управляет только своими пользователями, поэтому точно
+    знает, в избранном ли рецепт, и ждёт от переключателей 201 или 204.
+    Пока состояние неизвестно (данные могли измениться прошлым прогоном),
+    переключатель начинает с POST и принимает также ответ «уже добавлено»
+    (200 для избранного и корзины, 400 для подписки).
+    """
+
+    def __init__(self, client, data, users, options, seed):
+        self.client = client
+        self.data = data
+        self.users = users
+        self.random = random.Random(seed)
+        self.anonymous = options['anonymous']
+        self.write_ratio = options['write_ratio']
+        only = set(options['only'] or ())
+        self.reads = self._weights(READ_OPERATIONS, only)
+        self.writes = self._weights(WRITE_OPERATIONS, only)
+        self.state = {}
+
+    @staticmethod
+    def _weights(operations, only):
+        return {
+            name: weight for name, weight in operations.items()
+            if not only or name in only
+        }
+
+    def run(self, deadline, results):
+        """Выполняет запросы до дедлайна; results[операция] пополняется."""
+        while time.perf_counter() < deadline:
+            name = self._choose()
+            method, path, user, expected, toggle = getattr(self, name)()
+            headers = {}
+            if user is not None:
+                headers['Authorization'] = f'Token {user["token"]}'
+            status, elapsed, _ = self.client.request(
+                method, path, headers=headers
+            )
+            if toggle is not None and status in expected:
+                self.state[toggle] = method == 'POST'
+            results[name].append((status, elapsed, status in expected))
+
+    def _choose(self):
+        operations = self.reads
+        if not operations or (
+            self.writes and self.random.random() < self.write_ratio
+        ):
+            operations = self.writes
+        return self.random.choices(
+            list(operations), weights=list(operations.values())
+        )[0]
+
+    def _user(self, allow_anonymous=False):
+        if allow_anonymous and self.random.random() < self.anonymous:
+            return None
+        return self.random.choice(self.users)
+
+    def _page(self):
+        limit = self.random.choice(PAGE_LIMITS)
+        pages = max(1, min(MAX_PAGE, len(self.data['recipe_ids']) // limit))
+        return {'page': self.random.randint(1, pages), 'limit': limit}
+
+    def recipes_list(self):
+        path = f'/api/recipes/?{urlencode(self._page())}'
+        return 'GET', path, self._user(allow_anonymous=True), {200}, None
+
+    def recipes_filtered(self):
+        params = {'limit': self.random.choice(PAGE_LIMITS)}
+        choice = self.random.choice((
+            'tags', 'author', 'is_favorited', 'is_in_shopping_cart',
+            'search', 'ordering',
+        ))
+        if choice == 'tags':
+            params['tags'] = self.random.sample(
+                self.data['tag_slugs'],
+                self.random.randint(1, min(2, len(self.data['tag_slugs']))),
+            )
+        elif choice == 'author':
+            params['author'] = self.random.choice(self.data['author_ids'])
+        elif choice == 'search':
+            params['search'] = self.random.choice(self.data['search_terms'])
+        elif choice == 'ordering':
+            params['ordering'] = self.random.choice(
+                ('-favorites_count', '-in_carts_count', 'name')
+            )
+        else:
+            params[choice] = 1
+        path = f'/api/recipes/?{urlencode(params, doseq=True)}'
+        return 'GET', path, self._user(), {200}, None
+
+    def recipe_detail(self):
+        recipe_id = self.random.choice(self.data['recipe_ids'])
+        path = f'/api/recipes/{recipe_id}/'
+        return 'GET', path, self._user(allow_anonymous=True), {200}, None
+
+    def subscriptions(self):
+        path = '/api/users/subscriptions/?limit=6&recipes_limit=3'
+        return 'GET', path, self._user(), {200}, None
+
+    def download_shopping_cart(self):
+        path = '/api/recipes/download_shopping_cart/'
+        return 'GET', path, self._user(), {200, 202}, None
+
+    def _toggle(self, path, user, kind, target, exists_status):
+        toggle = (kind, user['id'], target)
+        current = self.state.get(toggle)
+        if current:
+            return 'DELETE', path, user, {204}, toggle
+        expected = {201} if current is False else {201, exists_status}
+        return 'POST', path, user, expected, toggle
+
+    def favorite_toggle(self):
+        recipe_id = self.random.choice(self.data['recipe_ids'])
+        return self._toggle(
+            f'/api/recipes/{recipe_id}/favorite/',
+            self._user(), 'favorite', recipe_id, 200,
+        )
+
+    def cart_toggle(self):
+        recipe_id = self.random.choice(self.data['recipe_ids'])
+        return self._toggle(
+            f'/api/recipes/{recipe_id}/shopping_cart/',
+            self._user(), 'cart', recipe_id, 200,
+        )
+
+    def subscribe_toggle(self):
+        user = self._user()
+        following = self.random.choice([
+            other['id'] for other in self.data['users']
+            if other['id'] != user['id']
+        ])
+        return self._toggle(
+            f'/api/users/{following}/subscribe/',
+            user, 'subscribe', following, 400,
+        )
+
+
+class Command(BaseCommand):
+    """Воспроизводимый нагрузочный прогон API со смесью чтения и записи."""
+
+    help = (
+        'Нагружает API данными из seed_bench_data: списки рецептов с '
+        'фильтрами, карточки, подписки, выгрузку корзины и переключение '
+        'избранного, корзины и подписок. Сохраняет число запросов в '
+        'секунду и перцентили задержки по каждой операции в JSON-отчёт.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url',
+            default='http://localhost:8000',
+            help='Базовый адрес сервера.',
+        )
+        parser.add_argument(
+            '--data',
+            default='data/bench_users.json',
+            help='Файл, созданный командой seed_bench_data.',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=16,
+            help='Количество одновременных клиентов.',
+        )
+        parser.add_argument(
+            '--duration',
+            type=float,
+            default=30,
+            help='Длительность замера, секунд.',
+        )
+        parser.add_argument(
+            '--warmup',
+            type=float,
+            default=5,
+            help='Длительность прогрева без записи результатов, секунд.',
+        )
+        parser.add_argument(
+            '--write-ratio',
+            type=float,
+            default=0.2,
+            help='Доля запросов на запись (0–1).',
+        )
+        parser.add_argument(
+            '--anonymous',
+            type=float,
+            default=0.3,
+            help='Доля анонимных запросов списка и карточки рецепта (0–1).',
+        )
+        parser.add_argument(
+            '--only',
+            action='append',
+            choices=(*READ_OPERATIONS, *WRITE_OPERATIONS),
+            help='Выполнять только эту операцию; можно указать несколько.',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Зерно генератора последовательности запросов.',
+        )
+        parser.add_argument(
+            '--label',
+            default='',
+            help='Метка прогона в отчёте, например ветка или коммит.',
+        )
+        parser.add_argument(
+            '--output',
+            default='data/bench_report.json',
+            help='Файл JSON-отчёта.',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            data = json.loads(Path(options['data']).read_text('utf-8'))
+        except FileNotFoundError:
+            raise CommandError(
+                f'Файл "{options["data"]}" не найден: сначала выполните '
+                f'python manage.py seed_bench_data.'
+            )
+        for option in ('write_ratio', 'anonymous'):
+            if not 0 <= options[option] <= 1:
+                raise CommandError(f'--{option.replace("_", "-")}: 0–1.')
+        if not 1 <= options['concurrency'] <= len(data['users']):
+            raise CommandError(
+                f'--concurrency: от 1 до {len(data["users"])} — у каждого '
+                f'клиента должны быть свои пользователи.'
+            )
+
+        concurrency = options['concurrency']
+        workers = [
+            ApiWorker(
+                HttpClient(options['url']),
+                data,
+                data['users'][number::concurrency],
+                options,
+                seed=options['seed'] + number,
+            )
+            for number in range(concurrency)
+        ]
+        started_at = datetime.now(timezone.utc)
+        if options['warmup']:
+            self._run(workers, options['warmup'])
+        results, elapsed = self._run(workers, options['duration'])
+        for worker in workers:
+            worker.client.close()
+
+        report = self._report(results, elapsed, started_at, options)
+        output = Path(options['output'])
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(
+            json.dumps(report, ensure_ascii=False, indent=2), 'utf-8'
+        )
+        self._print(report)
+        self.stdout.write(self.style.SUCCESS(f'Отчёт сохранён в {output}.'))
+
+    def _run(self, workers, duration):
+        """{операция: [(статус, мс, ожидаемый ли)]} и длительность."""
+        results = defaultdict(list)
+        lock = threading.Lock()
+
+        def worker(number, deadline):
+            local = defaultdict(list)
+            workers[number].run(deadline, local)
+            with lock:
+                for name, samples in local.items():
+                    results[name].extend(samples)
+
+        elapsed = run_workers(len(workers), duration, worker)
+        return results, elapsed
+
+    def _summary(self, samples, elapsed):
+        return {
+            'requests': len(samples),
+            'errors': sum(not ok for _, _, ok in samples),
+            'rps': round(len(samples) / elapsed, 2),
+            'latency_ms': latency_summary(
+                [ms for status, ms, _ in samples if status]
+            ),
+        }
+
+    def _report(self, results, elapsed, started_at, options):
+        operations = {}
+        for name in (*READ_OPERATIONS, *WRITE_OPERATIONS):
+            if name in results:
+                operations[name] = {
+                    **self._summary(results[name], elapsed),
+                    'statuses': {
+                        str(status): count for status, count in sorted(
+                            Counter(s for s, _, _ in results[name]).items()
+                        )
+                    },
+                }
+        return {
+            'started_at': started_at.isoformat(timespec='seconds'),
+            'label': options['label'],
+            'url': options['url'],
+            'concurrency': options['concurrency'],
+            'duration': round(elapsed, 2),
+            'warmup': options['warmup'],
+            'write_ratio': options['write_ratio'],
+            'anonymous': options['anonymous'],
+            'seed': options['seed'],
+            'total': self._summary(
+                [sample for samples in results.values()
+                 for sample in samples],
+                elapsed,
+            ),
+            'operations': operations,
+        }
+
+    def _print(self, report):
+        self.stdout.write(
+            f'{"операция":<24}{"запросов":>10}{"rps":>9}{"p50":>9}'
+            f'{"p95":>9}{"p99":>9}{"ошибки":>8}'
+        )
+        rows = [*report['operations'].items(), ('всего', report['total'])]
+        for name, summary in rows:
+            latency = summary['latency_ms'] or {}
+            self.stdout.write(
+                f'{name:<24}{summary["requests"]:>10}{summary["rps"]:>9.1f}'
+                f'{latency.get("p50", 0):>9.2f}{latency.get("p95", 0):>9.2f}'
+                f'{latency.get("p99", 0):>9.2f}{summary["errors"]:>8}'
+            )
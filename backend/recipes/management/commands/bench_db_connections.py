@@ -0,0 +1,107 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+MODES = ('connect', 'persistent', 'pool')
+
+
+class Command(BaseCommand):
+    """Сравнение задержки запроса при разных способах подключения."""
+
+    help = (
+        'Измеряет задержку одного запроса к базе: с новым соединением на '
+        'каждый запрос, с постоянным соединением и проверкой перед '
+        'использованием (CONN_MAX_AGE + CONN_HEALTH_CHECKS) и через пул '
+        'psycopg 3.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=200,
+            help='Количество запросов в каждом режиме.',
+        )
+        parser.add_argument(
+            '--query',
+            default='SELECT 1',
+            help='SQL-запрос, выполняемый на каждой итерации.',
+        )
+        parser.add_argument(
+            '--database',
+            default='default',
+            help='Алиас базы данных из settings.DATABASES.',
+        )
+        parser.add_argument(
+            '--mode',
+            choices=MODES,
+            action='append',
+            dest='modes',
+            help='Режим; можно указать несколько раз (по умолчанию все).',
+        )
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if connection.vendor != 'postgresql':
+            return self.stderr.write('Нужна база PostgreSQL.')
+        params = connection.get_connection_params()
+        params['autocommit'] = True
+        database = connection.Database
+
+        self.stdout.write(
+            f'{"режим":<12}{"среднее":>10}{"p50":>10}{"p95":>10}'
+            f'{"p99":>10}  мс'
+        )
+        for mode in options['modes'] or MODES:
+            timings = getattr(self, f'_bench_{mode}')(
+                database, params, options['query'], options['iterations']
+            )
+            percentiles = statistics.quantiles(timings, n=100)
+            self.stdout.write(
+                f'{mode:<12}{statistics.mean(timings):>10.3f}'
+                f'{percentiles[49]:>10.3f}{percentiles[94]:>10.3f}'
+                f'{percentiles[98]:>10.3f}'
+            )
+
+    @staticmethod
+    def _measure(iteration, iterations):
+        timings = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            iteration()
+            timings.append((time.perf_counter() - started) * 1000)
+        return timings
+
+    def _bench_connect(self, database, params, query, iterations):
+        """Новое соединение на каждый запрос (поведение по умолчанию)."""
+        def iteration():
+            with database.connect(**params) as conn:
+                conn.execute(query).fetchall()
+        return self._measure(iteration, iterations)
+
+    def _bench_persistent(self, database, params, query, iterations):
+        """Одно соединение и проверка `SELECT 1` перед каждым запросом."""
+        with database.connect(**params) as conn:
+            def iteration():
+                conn.execute('SELECT 1').fetchall()
+                conn.execute(query).fetchall()
+            return self._measure(iteration, iterations)
+
+    def _bench_pool(self, database, params, query, iterations):
+        """Соединение из пула psycopg 3 с проверкой при выдаче."""
+        from psycopg_pool import ConnectionPool
+
+        with ConnectionPool(
+            kwargs=params,
+            min_size=1,
+            max_size=1,
+            check=ConnectionPool.check_connection,
+        ) as pool:
+            pool.wait()
+
+            def iteration():
+                with pool.connection() as conn:
+                    conn.execute(query).fetchall()
+            return self._measure(iteration, iterations)
@@ -0,0 +1,120 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.benchmark import HttpClient, latency_summary, run_workers
+
+DEFAULT_PATHS = (
+    '/api/recipes/',
+    '/api/recipes/?page=2&limit=6',
+    '/api/ingredients/?name=мол',
+    '/api/tags/',
+)
+
+
+class Command(BaseCommand):
+    """Нагрузочное сравнение серверов по пропускной способности."""
+
+    help = (
+        'Отправляет GET-запросы на каждый сервер из --url (например, '
+        'gunicorn и uvicorn) в несколько потоков и выводит число запросов '
+        'в секунду и перцентили задержки по каждому пути.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url',
+            action='append',
+            dest='urls',
+            required=True,
+            help='Базовый адрес сервера; можно указать несколько раз.',
+        )
+        parser.add_argument(
+            '--path',
+            action='append',
+            dest='paths',
+            help='Путь с параметрами; можно указать несколько раз.',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=8,
+            help='Количество одновременных клиентов.',
+        )
+        parser.add_argument(
+            '--duration',
+            type=float,
+            default=10,
+            help='Длительность замера одного пути, секунд.',
+        )
+        parser.add_argument(
+            '--warmup',
+            type=int,
+            default=20,
+            help='Запросов на прогрев перед замером.',
+        )
+        parser.add_argument(
+            '--header',
+            action='append',
+            dest='headers',
+            default=[],
+            help='Заголовок запроса вида "Name: value".',
+        )
+
+    def handle(self, *args, **options):
+        headers = {}
+        for header in options['headers']:
+            name, separator, value = header.partition(':')
+            if not separator:
+                raise CommandError(f'Некорректный заголовок: {header}')
+            headers[name.strip()] = value.strip()
+
+        self.stdout.write(
+            f'{"сервер / путь":<48}{"rps":>9}{"p50":>9}{"p95":>9}'
+            f'{"p99":>9}{"ошибки":>8}'
+        )
+        for url in options['urls']:
+            for path in options['paths'] or DEFAULT_PATHS:
+                timings, errors, elapsed = self._run(
+                    url, path, headers, options
+                )
+                self._report(f'{url}{path}', timings, errors, elapsed)
+
+    def _run(self, url, path, headers, options):
+        timings, errors = [], []
+        lock = threading.Lock()
+
+        def worker(number, deadline):
+            client = HttpClient(url, headers)
+            local_timings, local_errors = [], 0
+            while time.perf_counter() < deadline:
+                status, elapsed, _ = client.request('GET', path)
+                if status:
+                    local_timings.append(elapsed)
+                if not status or status >= 400:
+                    local_errors += 1
+            client.close()
+            with lock:
+                timings.extend(local_timings)
+                errors.append(local_errors)
+
+        warmup = HttpClient(url, headers)
+        for _ in range(options['warmup']):
+            warmup.request('GET', path)
+        warmup.close()
+
+        elapsed = run_workers(
+            options['concurrency'], options['duration'], worker
+        )
+        return timings, sum(errors), elapsed
+
+    def _report(self, name, timings, errors, elapsed):
+        latency = latency_summary(timings)
+        if latency is None:
+            return self.stdout.write(f'{name:<48}  нет успешных ответов')
+        self.stdout.write(
+            f'{name[-48:]:<48}{len(timings) / elapsed:>9.1f}'
+            f'{latency["p50"]:>9.2f}{latency["p95"]:>9.2f}'
+            f'{latency["p99"]:>9.2f}{errors:>8}'
+        )
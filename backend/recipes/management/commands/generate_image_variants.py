@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from recipes.models import Recipe
+from recipes.tasks import generate_recipe_image_variants
+from users.models import User
+from users.tasks import generate_avatar_variants
+
+
+class Command(BaseCommand):
+    """Постановка в очередь обработки уже загруженных изображений."""
+
+    help = (
+        'Ставит в очередь Celery создание вариантов изображений рецептов '
+        'и аватаров, у которых их ещё нет.'
+    )
+
+    def handle(self, *args, **options):
+        recipe_ids = Recipe.objects.filter(image_variants={}).values_list(
+            'pk', flat=True
+        )
+        recipes_count = 0
+        for recipe_id in recipe_ids.iterator():
+            generate_recipe_image_variants.delay(recipe_id)
+            recipes_count += 1
+
+        user_ids = (
+            User.objects.filter(avatar_variants={})
+            .exclude(avatar__isnull=True).exclude(avatar='')
+            .values_list('pk', flat=True)
+        )
+        users_count = 0
+        for user_id in user_ids.iterator():
+            generate_avatar_variants.delay(user_id)
+            users_count += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f'В очереди {recipes_count} изображений рецептов '
+            f'и {users_count} аватаров.'
+        ))
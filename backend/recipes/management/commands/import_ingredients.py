@@ -1,15 +1,68 @@
 import csv
 import json
+from itertools import islice
 
+from django.conf import settings
 from django.core.management.base import BaseCommand
+from django.db import connection, transaction
 
+from backend.cache import INGREDIENTS, bump
 from recipes.models import Ingredient
 
+READ_CHUNK_SIZE = 64 * 1024
+JSON_SEPARATORS = ' \t\r\n,'
+
+
+def iter_json_array(file, chunk_size=READ_CHUNK_SIZE):
+    """Отдаёт элементы JSON-массива по одному, читая файл частями."""
+    decoder = json.JSONDecoder()
+    buffer, position, started = '', 0, False
+    while True:
+        chunk = file.read(chunk_size)
+        buffer, position = buffer[position:] + chunk, 0
+        while True:
+            while (position < len(buffer)
+                   and buffer[position] in JSON_SEPARATORS):
+                position += 1
+            if position == len(buffer):
+                break
+            if not started:
+                if buffer[position] != '[':
+                    raise json.JSONDecodeError(
+                        'Ожидался массив', buffer, position
+                    )
+                started, position = True, position + 1
+                continue
+            if buffer[position] == ']':
+                return
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if not chunk:
+                    raise
+                break
+            yield item
+        if not chunk:
+            raise json.JSONDecodeError(
+                'Незавершённый массив', buffer, position
+            )
+
+
+def batches(iterable, size):
+    """Разбивает поток на списки длиной не больше `size`."""
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
 
 class Command(BaseCommand):
-    """Загрузка ингредиентов из JSON или CSV файла."""
+    """Потоковая загрузка ингредиентов из JSON или CSV файла."""
 
-    help = 'Загружает ингредиенты из указанного файла (JSON или CSV).'
+    help = (
+        'Загружает ингредиенты из указанного файла (JSON или CSV). '
+        'Файл читается потоком, повторы отбрасываются в памяти, строки '
+        'загружаются через COPY во временную таблицу или bulk_create.'
+    )
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -18,6 +71,19 @@ class Command(BaseCommand):
             default='data/ingredients.json',
             help='Путь к файлу с ингредиентами (JSON или CSV).',
         )
+        parser.add_argument(
+            '--method',
+            choices=('copy', 'bulk'),
+            default='copy',
+            help='copy — COPY во временную таблицу и слияние (PostgreSQL), '
+                 'bulk — пачки bulk_create(ignore_conflicts=True).',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=10000,
+            help='Количество строк в одной пачке bulk_create.',
+        )
 
     def handle(self, *args, **options):
         file_path = options['file']
@@ -25,29 +91,89 @@ class Command(BaseCommand):
         if not file_path.endswith(('.json', '.csv')):
             return self.stderr.write('Файл должен быть JSON или CSV.')
 
+        self.stats = {'total': 0, 'skipped': 0, 'duplicates': 0}
+        load = self._load_bulk
+        if options['method'] == 'copy' and connection.vendor == 'postgresql':
+            load = self._load_copy
         try:
-            with open(file_path, encoding='utf-8') as file:
-                items = self._load_items(file, file_path)
+            with open(file_path, encoding='utf-8-sig', newline='') as file:
+                with transaction.atomic():
+                    inserted = load(
+                        self._unique_rows(self._iter_rows(file, file_path)),
+                        options['batch_size'],
+                    )
+                    if inserted:
+                        bump(INGREDIENTS)
         except FileNotFoundError:
             return self.stderr.write(f'Файл "{file_path}" не найден.')
         except json.JSONDecodeError:
             return self.stderr.write(
                 f'Ошибка чтения JSON-файла "{file_path}".')
 
-        created_count = sum(
-            1 for name, unit in items
-            if Ingredient.objects.get_or_create(
-                name=name.strip(), measurement_unit=unit.strip()
-            )[1]
-        )
-
-        self.stdout.write(
-            self.style.SUCCESS(f'Загружено {created_count} ингредиентов.')
-        )
+        skipped = self.stats['skipped'] + self.stats['total'] - inserted
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено {inserted} ингредиентов, '
+            f'пропущено {skipped} (уже есть или некорректные), '
+            f'повторов в файле {self.stats["duplicates"]}.'
+        ))
 
-    def _load_items(self, file, file_path):
-        """Возвращает список ингредиентов из JSON или CSV файла."""
+    def _iter_rows(self, file, file_path):
+        """Отдаёт пары (название, единица) из JSON или CSV файла."""
         if file_path.endswith('.json'):
-            data = json.load(file)
-            return [(i['name'], i['measurement_unit']) for i in data]
-        return [row for row in csv.reader(file) if len(row) >= 2]
+            for item in iter_json_array(file):
+                if not isinstance(item, dict):
+                    item = {}
+                yield item.get('name'), item.get('measurement_unit')
+            return
+        for row in csv.reader(file):
+            yield (row[0], row[1]) if len(row) >= 2 else (None, None)
+
+    def _unique_rows(self, rows):
+        """Отбрасывает некорректные строки и повторы внутри файла."""
+        seen = set()
+        for name, unit in rows:
+            name = str(name or '').strip()
+            unit = str(unit or '').strip()
+            if (not name or not unit
+                    or len(name) > settings.MAX_INGREDIENT_NAME_LENGTH
+                    or len(unit)
+                    > settings.MAX_INGREDIENT_MEASUREMENT_UNIT_LENGTH):
+                self.stats['skipped'] += 1
+                continue
+            if (name, unit) in seen:
+                self.stats['duplicates'] += 1
+                continue
+            seen.add((name, unit))
+            self.stats['total'] += 1
+            yield name, unit
+
+    def _load_copy(self, rows, batch_size):
+        """COPY во временную таблицу и одно слияние с ON CONFLICT."""
+        table = Ingredient._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMP TABLE ingredient_import '
+                '(name text, measurement_unit text) ON COMMIT DROP'
+            )
+            with cursor.copy(
+                'COPY ingredient_import (name, measurement_unit) FROM STDIN'
+            ) as copy:
+                for row in rows:
+                    copy.write_row(row)
+            cursor.execute(
+                f'INSERT INTO {table} (name, measurement_unit) '
+                f'SELECT name, measurement_unit FROM ingredient_import '
+                f'ON CONFLICT (name, measurement_unit) DO NOTHING'
+            )
+            return cursor.rowcount
+
+    def _load_bulk(self, rows, batch_size):
+        """Пачки bulk_create, пропускающие уже существующие строки."""
+        before = Ingredient.objects.count()
+        for batch in batches(rows, batch_size):
+            Ingredient.objects.bulk_create(
+                [Ingredient(name=name, measurement_unit=unit)
+                 for name, unit in batch],
+                ignore_conflicts=True,
+            )
+        return Ingredient.objects.count() - before
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from backend.cache import SHOPPING_LISTS, bump, shopping_cart_dependency
+from recipes.models import ShoppingListIngredient
+
+
+class Command(BaseCommand):
+    """Пересчёт агрегатов списков покупок по содержимому корзин."""
+
+    help = (
+        'Пересчитывает суммарные ингредиенты списков покупок '
+        '(всех или указанных пользователей).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=int,
+            action='append',
+            dest='user_ids',
+            help='ID пользователя; можно указать несколько раз.',
+        )
+
+    def handle(self, *args, **options):
+        user_ids = options['user_ids']
+        with transaction.atomic():
+            ShoppingListIngredient.objects.rebuild(user_ids)
+            if user_ids:
+                bump(*map(shopping_cart_dependency, user_ids))
+            else:
+                bump(SHOPPING_LISTS)
+
+        self.stdout.write(self.style.SUCCESS(
+            'Списки покупок пересчитаны'
+            + (f' для {len(user_ids)} пользователей.' if user_ids else '.')
+        ))
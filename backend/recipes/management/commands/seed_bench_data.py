@@ -0,0 +1,261 @@
+import io
+import json
+import random
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from PIL import Image
+from rest_framework.authtoken.models import Token
+
+from backend.cache import (INGREDIENTS, RECIPES, SHOPPING_LISTS, TAGS, USERS,
+                           bump)
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingList, ShoppingListIngredient, Tag)
+from users.models import Subscription
+
+User = get_user_model()
+
+EMAIL_DOMAIN = 'bench.foodgram.local'
+BENCH_PASSWORD = 'bench-password'
+BENCH_TAGS = (
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#49B64E', 'lunch'),
+    ('Ужин', '#8775D2', 'dinner'),
+)
+BENCH_INGREDIENTS = (
+    ('картофель', 'г'), ('морковь', 'г'), ('лук репчатый', 'г'),
+    ('молоко', 'мл'), ('яйца куриные', 'шт.'), ('мука пшеничная', 'г'),
+    ('сахар', 'г'), ('соль', 'г'), ('сливочное масло', 'г'),
+    ('курица', 'г'), ('рис', 'г'), ('томаты', 'г'),
+)
+ADJECTIVES = (
+    'Домашний', 'Быстрый', 'Пряный', 'Летний', 'Зимний', 'Сытный',
+    'Лёгкий', 'Праздничный', 'Бабушкин', 'Острый',
+)
+DISHES = (
+    'суп', 'пирог', 'салат', 'плов', 'омлет', 'рагу', 'соус', 'гуляш',
+    'запеканка', 'каша',
+)
+BATCH_SIZE = 5000
+BENCH_IMAGE = 'recipes/bench.png'
+
+
+class Command(BaseCommand):
+    """Тестовые данные для нагрузочного прогона `bench_api`."""
+
+    help = (
+        'Создаёт пользователей с токенами, рецепты, избранное, корзины и '
+        'подписки для нагрузочного прогона и сохраняет токены и id в JSON. '
+        'Данные детерминированы параметром --seed.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users',
+            type=int,
+            default=200,
+            help='Количество пользователей.',
+        )
+        parser.add_argument(
+            '--recipes',
+            type=int,
+            default=2000,
+            help='Количество рецептов.',
+        )
+        parser.add_argument(
+            '--ingredients-per-recipe',
+            type=int,
+            default=8,
+            help='Ингредиентов в одном рецепте.',
+        )
+        parser.add_argument(
+            '--favorites',
+            type=int,
+            default=20,
+            help='Рецептов в избранном у каждого пользователя.',
+        )
+        parser.add_argument(
+            '--cart',
+            type=int,
+            default=5,
+            help='Рецептов в корзине у каждого пользователя.',
+        )
+        parser.add_argument(
+            '--subscriptions',
+            type=int,
+            default=10,
+            help='Подписок у каждого пользователя.',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Зерно генератора случайных чисел.',
+        )
+        parser.add_argument(
+            '--output',
+            default='data/bench_users.json',
+            help='Файл для токенов и id, который читает bench_api.',
+        )
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help='Удалить ранее созданные тестовые данные.',
+        )
+
+    def handle(self, *args, **options):
+        bench_users = User.objects.filter(email__endswith=f'@{EMAIL_DOMAIN}')
+        if bench_users.exists() and not options['clear']:
+            raise CommandError(
+                'Тестовые данные уже есть: используйте --clear, чтобы '
+                'создать их заново.'
+            )
+        if options['users'] < 2 or options['recipes'] < 1:
+            raise CommandError('Нужно минимум 2 пользователя и 1 рецепт.')
+
+        self.random = random.Random(options['seed'])
+        with transaction.atomic():
+            bench_users.delete()
+            users = self._create_users(options['users'])
+            tags = self._ensure_tags()
+            ingredients = list(Ingredient.objects.order_by('pk'))
+            if len(ingredients) < options['ingredients_per_recipe']:
+                ingredients = self._ensure_ingredients()
+            recipes = self._create_recipes(
+                users, tags, ingredients, options
+            )
+            self._create_links(users, recipes, options)
+            bump(RECIPES, TAGS, INGREDIENTS, USERS, SHOPPING_LISTS)
+
+        output = Path(options['output'])
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps({
+            'seed': options['seed'],
+            'users': [
+                {'id': user.pk, 'token': token} for user, token in users
+            ],
+            'recipe_ids': [recipe.pk for recipe in recipes],
+            'author_ids': sorted({recipe.author_id for recipe in recipes}),
+            'tag_slugs': [tag.slug for tag in tags],
+            'search_terms': list(DISHES),
+        }, ensure_ascii=False, indent=2), encoding='utf-8')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано {len(users)} пользователей и {len(recipes)} рецептов, '
+            f'токены сохранены в {output}.'
+        ))
+
+    def _create_users(self, count):
+        """Пользователи с общим паролем и токенами: [(user, key)]."""
+        password = make_password(BENCH_PASSWORD)
+        users = User.objects.bulk_create([
+            User(
+                email=f'bench_user_{number}@{EMAIL_DOMAIN}',
+                username=f'bench_user_{number}',
+                first_name='Тестовый',
+                last_name=f'Пользователь {number}',
+                password=password,
+            )
+            for number in range(count)
+        ], batch_size=BATCH_SIZE)
+        tokens = Token.objects.bulk_create(
+            [Token(user=user, key=Token.generate_key()) for user in users],
+            batch_size=BATCH_SIZE,
+        )
+        return [(user, token.key) for user, token in zip(users, tokens)]
+
+    def _ensure_tags(self):
+        tags = list(Tag.objects.order_by('pk'))
+        if tags:
+            return tags
+        return Tag.objects.bulk_create([
+            Tag(name=name, color=color, slug=slug)
+            for name, color, slug in BENCH_TAGS
+        ])
+
+    def _ensure_ingredients(self):
+        Ingredient.objects.bulk_create(
+            [Ingredient(name=name, measurement_unit=unit)
+             for name, unit in BENCH_INGREDIENTS],
+            ignore_conflicts=True,
+        )
+        return list(Ingredient.objects.order_by('pk'))
+
+    def _create_recipes(self, users, tags, ingredients, options):
+        """Рецепты с одной общей картинкой, тегами и ингредиентами."""
+        image = BENCH_IMAGE
+        if not default_storage.exists(image):
+            buffer = io.BytesIO()
+            Image.new('RGB', (64, 64), (226, 108, 45)).save(buffer, 'PNG')
+            image = default_storage.save(image, ContentFile(buffer.getvalue()))
+        authors = [user for user, _ in users]
+        recipes = Recipe.objects.bulk_create([
+            Recipe(
+                author=self.random.choice(authors),
+                name=(
+                    f'{self.random.choice(ADJECTIVES)} '
+                    f'{self.random.choice(DISHES)} №{number}'
+                ),
+                image=image,
+                text='Рецепт для нагрузочного тестирования.',
+                cooking_time=self.random.randint(5, 180),
+            )
+            for number in range(1, options['recipes'] + 1)
+        ], batch_size=BATCH_SIZE)
+
+        RecipeTag = Recipe.tags.through
+        RecipeTag.objects.bulk_create([
+            RecipeTag(recipe_id=recipe.pk, tag_id=tag.pk)
+            for recipe in recipes
+            for tag in self.random.sample(
+                tags, self.random.randint(1, min(len(tags), 2))
+            )
+        ], batch_size=BATCH_SIZE)
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(
+                recipe_id=recipe.pk,
+                ingredient_id=ingredient.pk,
+                amount=self.random.randint(1, 500),
+            )
+            for recipe in recipes
+            for ingredient in self.random.sample(ingredients, min(
+                len(ingredients), options['ingredients_per_recipe']
+            ))
+        ], batch_size=BATCH_SIZE)
+        Recipe.objects.filter(
+            pk__in=[recipe.pk for recipe in recipes]
+        ).update_search_vector()
+        return recipes
+
+    def _create_links(self, users, recipes, options):
+        """Избранное, корзины и подписки; счётчики и агрегаты корзин."""
+        recipe_ids = [recipe.pk for recipe in recipes]
+        authors = sorted({recipe.author_id for recipe in recipes})
+        for model, option in ((Favorite, 'favorites'),
+                              (ShoppingList, 'cart')):
+            model.objects.bulk_create([
+                model(user_id=user.pk, recipe_id=recipe_id)
+                for user, _ in users
+                for recipe_id in self.random.sample(
+                    recipe_ids, min(options[option], len(recipe_ids))
+                )
+            ], batch_size=BATCH_SIZE, ignore_conflicts=True)
+        subscriptions = []
+        for user, _ in users:
+            following = [author for author in authors if author != user.pk]
+            subscriptions.extend(
+                Subscription(follower_id=user.pk, following_id=author)
+                for author in self.random.sample(
+                    following, min(options['subscriptions'], len(following))
+                )
+            )
+        Subscription.objects.bulk_create(
+            subscriptions, batch_size=BATCH_SIZE, ignore_conflicts=True
+        )
+        Recipe.objects.filter(pk__in=recipe_ids).reconcile_counters()
+        ShoppingListIngredient.objects.rebuild([user.pk for user, _ in users])
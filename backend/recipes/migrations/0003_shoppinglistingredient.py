@@ -0,0 +1,51 @@
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+FILL_SHOPPING_LIST_INGREDIENTS = '''
+    INSERT INTO recipes_shoppinglistingredient (user_id, ingredient_id, amount)
+    SELECT cart.user_id, item.ingredient_id, SUM(item.amount)
+    FROM recipes_shoppinglist cart
+    JOIN recipes_recipeingredient item ON item.recipe_id = cart.recipe_id
+    GROUP BY cart.user_id, item.ingredient_id
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0002_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShoppingListIngredient',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True,
+                 primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.IntegerField(
+                    default=0, verbose_name='Количество')),
+                ('ingredient', models.ForeignKey(
+                    on_delete=django.db.models.deletion.CASCADE,
+                    related_name='shopping_list_ingredients',
+                    to='recipes.ingredient',
+                    verbose_name='Ингредиент')),
+                ('user', models.ForeignKey(
+                    on_delete=django.db.models.deletion.CASCADE,
+                    related_name='shopping_list_ingredients',
+                    to=settings.AUTH_USER_MODEL,
+                    verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Ингредиент списка покупок',
+                'verbose_name_plural': 'Ингредиенты списков покупок',
+                'constraints': [models.UniqueConstraint(
+                    fields=('user', 'ingredient'),
+                    name='unique_shopping_list_ingredient')],
+            },
+        ),
+        migrations.RunSQL(
+            FILL_SHOPPING_LIST_INGREDIENTS, migrations.RunSQL.noop
+        ),
+    ]
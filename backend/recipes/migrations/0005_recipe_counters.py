@@ -0,0 +1,52 @@
+from django.db import migrations, models
+
+FILL_COUNTERS = '''
+    UPDATE recipes_recipe recipe SET
+        favorites_count = (
+            SELECT count(*) FROM recipes_favorite favorite
+            WHERE favorite.recipe_id = recipe.id
+        ),
+        in_carts_count = (
+            SELECT count(*) FROM recipes_shoppinglist cart
+            WHERE cart.recipe_id = recipe.id
+        )
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_recipe_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name='В избранном'
+            ),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='in_carts_count',
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name='В корзинах'
+            ),
+        ),
+        migrations.RunSQL(FILL_COUNTERS, migrations.RunSQL.noop),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(
+                fields=['-favorites_count', 'id'],
+                name='recipe_favorites_count_idx',
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(
+                fields=['-in_carts_count', 'id'],
+                name='recipe_in_carts_count_idx',
+            ),
+        ),
+    ]
@@ -1,8 +1,11 @@
 from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
 
-from .querysets import RecipeQuerySet
+from .querysets import (RecipeQuerySet, ShoppingListIngredientQuerySet,
+                        UserRecipeQuerySet)
 
 
 class Ingredient(models.Model):
@@ -69,6 +72,12 @@ class Recipe(models.Model):
         upload_to='recipes/',
         verbose_name='Изображение',
     )
+    image_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name='Варианты изображения',
+    )
     text = models.TextField(verbose_name='Описание')
     ingredients = models.ManyToManyField(
         Ingredient,
@@ -91,6 +100,21 @@ class Recipe(models.Model):
             ),
         ],
     )
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        verbose_name='Поисковый вектор',
+    )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В избранном',
+    )
+    in_carts_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В корзинах',
+    )
     objects = RecipeQuerySet.as_manager()
 
     class Meta:
@@ -98,6 +122,22 @@ class Recipe(models.Model):
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('name',)
+        indexes = [
+            GinIndex(fields=('search_vector',), name='recipe_search_idx'),
+            GinIndex(
+                fields=('name',),
+                name='recipe_name_trgm_idx',
+                opclasses=('gin_trgm_ops',),
+            ),
+            models.Index(
+                fields=('-favorites_count', 'id'),
+                name='recipe_favorites_count_idx',
+            ),
+            models.Index(
+                fields=('-in_carts_count', 'id'),
+                name='recipe_in_carts_count_idx',
+            ),
+        ]
 
     def __str__(self):
         return f'{self.name} - {self.author}'
@@ -163,6 +203,8 @@ class UserRelatedModel(models.Model):
         verbose_name='Рецепт',
     )
 
+    objects = UserRecipeQuerySet.as_manager()
+
     class Meta:
         abstract = True
         constraints = [
@@ -182,6 +224,8 @@ class UserRelatedModel(models.Model):
 class Favorite(UserRelatedModel):
     """Модель избранных рецептов."""
 
+    counter_field = 'favorites_count'
+
     class Meta(UserRelatedModel.Meta):
         verbose_name = 'избранное'
         verbose_name_plural = 'избранные'
@@ -190,6 +234,44 @@ class Favorite(UserRelatedModel):
 class ShoppingList(UserRelatedModel):
     """Модель списка покупок."""
 
+    counter_field = 'in_carts_count'
+
     class Meta(UserRelatedModel.Meta):
         verbose_name = 'список покупок'
         verbose_name_plural = 'списки покупок'
+
+
+class ShoppingListIngredient(models.Model):
+    """Суммарное количество ингредиента в списке покупок пользователя.
+
+    Поддерживается инкрементально при изменении корзины и рецептов,
+    пересчитывается командой `rebuild_shopping_lists`.
+    """
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь',
+        related_name='shopping_list_ingredients',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        verbose_name='Ингредиент',
+        related_name='shopping_list_ingredients',
+    )
+    amount = models.IntegerField(default=0, verbose_name='Количество')
+    objects = ShoppingListIngredientQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Ингредиент списка покупок'
+        verbose_name_plural = 'Ингредиенты списков покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='unique_shopping_list_ingredient'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.user} — {self.ingredient}: {self.amount}'
@@ -1,6 +1,14 @@
 from django.apps import apps
-from django.db import models
-from django.db.models import BooleanField, Exists, OuterRef, Value
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import SearchVector
+from django.db import connections, models, router
+from django.db.models import (BooleanField, Count, Exists, F, OuterRef, Q,
+                              Subquery, TextField, Value)
+from django.db.models.functions import Coalesce, Greatest
+
+from backend.cache import bump, recipe_stats_dependency
+
+SEARCH_CONFIG = 'russian'
 
 
 class RecipeQuerySet(models.QuerySet):
@@ -25,3 +33,222 @@ class RecipeQuerySet(models.QuerySet):
                 ShoppingList.objects.filter(recipe=OuterRef('pk'), user=user)
             ),
         )
+
+    def change_counter(self, field, recipe_ids, delta):
+        """Атомарно меняет счётчик рецептов, не опуская его ниже нуля."""
+        if not recipe_ids:
+            return 0
+        return self.filter(pk__in=recipe_ids).update(
+            **{field: Greatest(F(field) + delta, 0)}
+        )
+
+    def reconcile_counters(self):
+        """Сверяет счётчики избранного и корзин с таблицами связей.
+
+        Обновляет только разошедшиеся рецепты и возвращает их id.
+        """
+        Favorite = apps.get_model('recipes', 'Favorite')
+        ShoppingList = apps.get_model('recipes', 'ShoppingList')
+        links = {
+            'favorites_count': Favorite,
+            'in_carts_count': ShoppingList,
+        }
+        actual = {
+            field: Coalesce(Subquery(
+                model.objects.filter(recipe=OuterRef('pk'))
+                .order_by()
+                .values('recipe')
+                .annotate(total=Count('pk'))
+                .values('total')
+            ), 0)
+            for field, model in links.items()
+        }
+        drifted = self.annotate(
+            **{f'actual_{field}': value for field, value in actual.items()}
+        ).filter(
+            ~Q(favorites_count=F('actual_favorites_count'))
+            | ~Q(in_carts_count=F('actual_in_carts_count'))
+        )
+        recipe_ids = list(drifted.values_list('pk', flat=True))
+        if recipe_ids:
+            self.filter(pk__in=recipe_ids).update(**actual)
+        return recipe_ids
+
+    def update_search_vector(self):
+        """Пересчитывает поисковый вектор: название, ингредиенты, текст."""
+        RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+        ingredient_names = Subquery(
+            RecipeIngredient.objects.filter(recipe=OuterRef('pk'))
+            .values('recipe')
+            .annotate(names=StringAgg('ingredient__name', ' '))
+            .values('names')
+        )
+        return self.update(
+            search_vector=(
+                SearchVector('name', weight='A', config=SEARCH_CONFIG)
+                + SearchVector(
+                    Coalesce(
+                        ingredient_names, Value(''), output_field=TextField()
+                    ),
+                    weight='B',
+                    config=SEARCH_CONFIG,
+                )
+                + SearchVector('text', weight='C', config=SEARCH_CONFIG)
+            )
+        )
+
+
+class UserRecipeQuerySet(models.QuerySet):
+    """QuerySet для связей «пользователь — рецепт» (избранное, корзина).
+
+    Добавление и удаление выполняются одним запросом без гонок
+    и без сигналов отдельных строк. Тем же запросом меняется счётчик
+    рецептов из `counter_field` модели.
+    """
+
+    def _execute(self, sql, params):
+        connection = connections[router.db_for_write(self.model)]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+    def _counted(self, changed, delta):
+        """CTE, меняющее счётчик рецептов из CTE `changed` на `delta`.
+
+        Рецепт встречается в `changed` не больше раза: у пользователя
+        одна связь с рецептом.
+        """
+        Recipe = apps.get_model('recipes', 'Recipe')
+        field = self.model.counter_field
+        return (
+            f'counted AS ('
+            f'UPDATE {Recipe._meta.db_table} recipe '
+            f'SET {field} = GREATEST(recipe.{field} + {int(delta)}, 0) '
+            f'FROM {changed} WHERE recipe.id = {changed}.recipe_id)'
+        )
+
+    def add(self, user_id, recipe_ids):
+        """Добавляет рецепты пользователю, пропуская уже добавленные.
+
+        Возвращает пару списков: id существующих рецептов из `recipe_ids`
+        и id действительно добавленных.
+        """
+        Recipe = apps.get_model('recipes', 'Recipe')
+        table = self.model._meta.db_table
+        recipe_table = Recipe._meta.db_table
+        rows = self._execute(
+            f'WITH added AS ('
+            f'INSERT INTO {table} (user_id, recipe_id) '
+            f'SELECT %s, id FROM {recipe_table} WHERE id = ANY(%s) '
+            f'ON CONFLICT (user_id, recipe_id) DO NOTHING '
+            f'RETURNING recipe_id), '
+            f'{self._counted("added", 1)} '
+            f'SELECT recipe.id, added.recipe_id IS NOT NULL '
+            f'FROM {recipe_table} recipe '
+            f'LEFT JOIN added ON added.recipe_id = recipe.id '
+            f'WHERE recipe.id = ANY(%s)',
+            [user_id, list(recipe_ids), list(recipe_ids)],
+        )
+        added = [recipe_id for recipe_id, is_added in rows if is_added]
+        bump(*map(recipe_stats_dependency, added))
+        return [recipe_id for recipe_id, _ in rows], added
+
+    def remove(self, user_id, recipe_ids=None):
+        """Удаляет рецепты пользователя (без `recipe_ids` — все).
+
+        Возвращает id удалённых рецептов.
+        """
+        sql = f'DELETE FROM {self.model._meta.db_table} WHERE user_id = %s'
+        params = [user_id]
+        if recipe_ids is not None:
+            sql += ' AND recipe_id = ANY(%s)'
+            params.append(list(recipe_ids))
+        removed = [
+            recipe_id
+            for recipe_id, in self._execute(
+                f'WITH removed AS ({sql} RETURNING recipe_id), '
+                f'{self._counted("removed", -1)} '
+                f'SELECT recipe_id FROM removed',
+                params,
+            )
+        ]
+        bump(*map(recipe_stats_dependency, removed))
+        return removed
+
+
+class ShoppingListIngredientQuerySet(models.QuerySet):
+    """QuerySet для агрегата ингредиентов списка покупок."""
+
+    def _upsert(self, select_sql, params):
+        """Прибавляет к агрегату строки (user_id, ingredient_id, amount)."""
+        table = self.model._meta.db_table
+        connection = connections[router.db_for_write(self.model)]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} (user_id, ingredient_id, amount) '
+                f'{select_sql} '
+                f'ON CONFLICT (user_id, ingredient_id) '
+                f'DO UPDATE SET amount = {table}.amount + EXCLUDED.amount',
+                params,
+            )
+
+    def apply_recipes(self, user_id, recipe_ids, sign=1):
+        """Прибавляет (sign=1) или вычитает (sign=-1) ингредиенты рецептов."""
+        if not recipe_ids:
+            return
+        RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+        self._upsert(
+            f'SELECT %s, ingredient_id, %s * SUM(amount) '
+            f'FROM {RecipeIngredient._meta.db_table} '
+            f'WHERE recipe_id = ANY(%s) GROUP BY ingredient_id',
+            [user_id, sign, list(recipe_ids)],
+        )
+
+    def apply_to_carts(self, recipe_id, deltas):
+        """Применяет изменения ингредиентов рецепта ко всем корзинам с ним.
+
+        `deltas` — словарь {ingredient_id: изменение количества}.
+        """
+        deltas = {pk: delta for pk, delta in deltas.items() if delta}
+        if not deltas:
+            return
+        ShoppingList = apps.get_model('recipes', 'ShoppingList')
+        self._upsert(
+            f'SELECT cart.user_id, delta.ingredient_id, delta.amount '
+            f'FROM {ShoppingList._meta.db_table} cart '
+            f'CROSS JOIN unnest(%s::bigint[], %s::integer[]) '
+            f'AS delta (ingredient_id, amount) '
+            f'WHERE cart.recipe_id = %s',
+            [list(deltas), list(deltas.values()), recipe_id],
+        )
+
+    def rebuild(self, user_ids=None):
+        """Пересчитывает агрегат с нуля по содержимому корзин."""
+        ShoppingList = apps.get_model('recipes', 'ShoppingList')
+        RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+        stale = self.all()
+        where, params = '', []
+        if user_ids is not None:
+            stale = stale.filter(user_id__in=user_ids)
+            where, params = 'WHERE cart.user_id = ANY(%s)', [list(user_ids)]
+        stale.delete()
+        self._upsert(
+            f'SELECT cart.user_id, item.ingredient_id, SUM(item.amount) '
+            f'FROM {ShoppingList._meta.db_table} cart '
+            f'JOIN {RecipeIngredient._meta.db_table} item '
+            f'ON item.recipe_id = cart.recipe_id '
+            f'{where} GROUP BY cart.user_id, item.ingredient_id',
+            params,
+        )
+
+    def for_user(self, user_id):
+        """Строки списка покупок пользователя, отсортированные по названию."""
+        return (
+            self.filter(user_id=user_id, amount__gt=0)
+            .values(
+                name=models.F('ingredient__name'),
+                unit=models.F('ingredient__measurement_unit'),
+                total_amount=models.F('amount'),
+            )
+            .order_by('name')
+        )
@@ -1,17 +1,173 @@
 import logging
 
-from django.core.cache import cache
-from django.db.models.signals import post_delete, post_save
-from django.dispatch import receiver
+from django.db import transaction
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import Signal, receiver
 
-from .models import ShoppingList
+from backend.cache import (INGREDIENTS, RECIPES, TAGS, bump, recipe_dependency,
+                           recipe_stats_dependency, shopping_cart_dependency)
+
+from .models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                     ShoppingList, ShoppingListIngredient, Tag)
+from .tasks import generate_recipe_image_variants
 
 logger = logging.getLogger(__name__)
 
+# Отправляется после изменения ингредиентов рецепта в обход сигналов модели
+# (bulk_create, инлайны админки). Аргументы: recipe, old и new — словари
+# {ingredient_id: amount} до и после изменения.
+recipe_ingredients_changed = Signal()
+
+# Отправляется после пакетного изменения избранного или корзины, когда
+# сигналы отдельных строк не срабатывают. sender — модель (Favorite или
+# ShoppingList), аргументы: user_id, added и removed — списки id рецептов.
+# Счётчики рецептов к этому моменту уже изменены тем же запросом
+# (см. UserRecipeQuerySet).
+user_recipes_changed = Signal()
+
 
 @receiver(post_save, sender=ShoppingList)
 @receiver(post_delete, sender=ShoppingList)
 def invalidate_shopping_cache(sender, instance, **kwargs):
-    user_id = instance.user_id
-    cache_key = f'shopping_list_user_{user_id}'
-    cache.delete(cache_key)
+    bump(shopping_cart_dependency(instance.user_id))
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_ingredient_index(sender, instance, **kwargs):
+    """Меняет версию каталога, по которой перезагружается индекс."""
+    bump(INGREDIENTS)
+
+
+@receiver(post_save, sender=Recipe)
+def update_recipe_search_vector(sender, instance, **kwargs):
+    """Обновляет поисковый вектор рецепта после фиксации транзакции.
+
+    К этому моменту ингредиенты рецепта уже сохранены.
+    """
+    transaction.on_commit(
+        lambda: Recipe.objects.filter(pk=instance.pk).update_search_vector()
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def schedule_recipe_image_variants(sender, instance, **kwargs):
+    """Запускает обработку изображения, если оно сменилось."""
+    source = instance.image.name or None
+    if instance.image_variants.get('source') != source:
+        transaction.on_commit(
+            lambda: generate_recipe_image_variants.delay(instance.pk)
+        )
+
+
+@receiver(post_save, sender=Ingredient)
+def update_ingredient_recipes_search_vector(sender, instance, created,
+                                            **kwargs):
+    """Обновляет поисковые векторы рецептов с переименованным ингредиентом."""
+    if not created:
+        Recipe.objects.filter(
+            ingredients=instance
+        ).update_search_vector()
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def invalidate_recipe_cache(sender, instance, **kwargs):
+    """Делает устаревшими все записи кэша, зависящие от рецепта."""
+    bump(recipe_dependency(instance.pk), RECIPES)
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def invalidate_recipe_ingredient_cache(sender, instance, **kwargs):
+    bump(recipe_dependency(instance.recipe_id), RECIPES)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipe_tags_cache(sender, instance, action, **kwargs):
+    if action.startswith('post_') and isinstance(instance, Recipe):
+        bump(recipe_dependency(instance.pk), RECIPES)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_tags_cache(sender, instance, **kwargs):
+    bump(TAGS)
+
+
+@receiver(post_save, sender=ShoppingList)
+def add_to_shopping_list(sender, instance, created, **kwargs):
+    """Добавляет ингредиенты рецепта в агрегат списка покупок."""
+    if created:
+        ShoppingListIngredient.objects.apply_recipes(
+            instance.user_id, [instance.recipe_id]
+        )
+
+
+@receiver(pre_delete, sender=ShoppingList)
+def remove_from_shopping_list(sender, instance, **kwargs):
+    """Вычитает ингредиенты рецепта из агрегата списка покупок.
+
+    Срабатывает до удаления, пока ингредиенты рецепта ещё существуют
+    (важно при каскадном удалении самого рецепта).
+    """
+    ShoppingListIngredient.objects.apply_recipes(
+        instance.user_id, [instance.recipe_id], sign=-1
+    )
+
+
+@receiver(recipe_ingredients_changed)
+def update_shopping_lists(sender, recipe, old, new, **kwargs):
+    """Переносит изменения ингредиентов рецепта в списки покупок."""
+    deltas = {
+        ingredient_id: new.get(ingredient_id, 0) - old.get(ingredient_id, 0)
+        for ingredient_id in old.keys() | new.keys()
+    }
+    if not any(deltas.values()):
+        return
+    ShoppingListIngredient.objects.apply_to_carts(recipe.pk, deltas)
+    bump(recipe_dependency(recipe.pk))
+
+
+@receiver(recipe_ingredients_changed)
+def refresh_recipe_ingredients(sender, recipe, old, new, **kwargs):
+    """Обновляет кэш и поисковый вектор после смены ингредиентов.
+
+    Ингредиенты пишутся пакетно, без сигналов модели, а сам рецепт при
+    этом может не сохраняться.
+    """
+    if old == new:
+        return
+    bump(RECIPES)
+    transaction.on_commit(
+        lambda: Recipe.objects.filter(pk=recipe.pk).update_search_vector()
+    )
+
+
+@receiver(user_recipes_changed, sender=ShoppingList)
+def update_shopping_list_batch(sender, user_id, added, removed, **kwargs):
+    """Применяет пакет изменений корзины к агрегату одним махом."""
+    ShoppingListIngredient.objects.apply_recipes(user_id, added)
+    ShoppingListIngredient.objects.apply_recipes(user_id, removed, sign=-1)
+    if added or removed:
+        bump(shopping_cart_dependency(user_id))
+
+
+def change_recipe_counters(model, added=(), removed=()):
+    Recipe.objects.change_counter(model.counter_field, added, 1)
+    Recipe.objects.change_counter(model.counter_field, removed, -1)
+    bump(*map(recipe_stats_dependency, [*added, *removed]))
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingList)
+def increment_recipe_counter(sender, instance, created, **kwargs):
+    if created:
+        change_recipe_counters(sender, added=[instance.recipe_id])
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingList)
+def decrement_recipe_counter(sender, instance, **kwargs):
+    change_recipe_counters(sender, removed=[instance.recipe_id])
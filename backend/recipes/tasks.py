@@ -1,35 +1,132 @@
+import hashlib
 import logging
+import os
+from datetime import timedelta
 
 from celery import shared_task
-from django.core.cache import cache
-from django.db.models import F, Sum
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage, storages
+from django.utils import timezone
 
-from recipes.models import RecipeIngredient
+from backend.cache import (RECIPES, SHOPPING_LISTS, bump, get_dependent,
+                           get_versions, recipe_dependency,
+                           recipe_stats_dependency, set_dependent,
+                           shopping_cart_dependency)
+from backend.images import refresh_variants
+from backend.replicas import replica_reads
+from recipes.exports import EXPORT_FORMATS
+from recipes.models import Recipe, ShoppingList, ShoppingListIngredient
 
 logger = logging.getLogger(__name__)
 
+SHOPPING_LIST_CACHE_KEY = 'shopping_list_user_{}_{}'
+SHOPPING_LIST_STORAGE = 'shopping_lists'
+
+
+def get_cached_shopping_list(user_id, export_format):
+    """Возвращает описание актуального файла списка покупок или None.
+
+    Запись без файла (его уже удалила очистка) считается промахом.
+    """
+    result = get_dependent(
+        SHOPPING_LIST_CACHE_KEY.format(user_id, export_format)
+    )
+    if result and storages[SHOPPING_LIST_STORAGE].exists(result['name']):
+        return result
+    return None
+
 
 @shared_task
-def generate_shopping_list_text(user_id):
-    """Генерируем список покупок И КЭШИРУЕМ его."""
-    cache_key = f'shopping_list_user_{user_id}'
-    cached_result = cache.get(cache_key)
+def generate_shopping_list(user_id, export_format='txt'):
+    """Формирует файл списка покупок в медиа-хранилище и кэширует ссылку.
+
+    Файл называется по хэшу содержимого, поэтому одинаковые списки
+    не дублируются, а хэш служит ETag. В результат задачи попадает только
+    описание файла: {'name': ..., 'etag': ..., 'format': ...}.
+    Запись кэша зависит от корзины пользователя и от каждого рецепта в ней.
+    """
+    cached_result = get_cached_shopping_list(user_id, export_format)
     if cached_result:
         return cached_result
-    ingredients = (
-        RecipeIngredient.objects.filter(recipe__shoppinglist__user_id=user_id)
-        .values(
-            name=F('ingredient__name'),
-            unit=F('ingredient__measurement_unit')
-        )
-        .annotate(total_amount=Sum('amount'))
-        .order_by('name')
+    return render_shopping_list(user_id, export_format)
+
+
+def render_shopping_list(user_id, export_format):
+    """Формирует файл списка покупок и кэширует его описание.
+
+    Корзина читается с primary: описание файла кэшируется до смены версий,
+    и список с отставшей реплики остался бы в кэше как актуальный.
+    """
+    versions = get_versions(
+        (SHOPPING_LISTS, shopping_cart_dependency(user_id))
     )
-    lines = []
-    for ing in ingredients:
-        line = f"{ing['name']} ({ing['unit']}) — {ing['total_amount']}"
-        lines.append(line)
-
-    content = "\n".join(lines) if lines else "Список покупок пуст"
-    cache.set(cache_key, content, timeout=300)
-    return content
+    with replica_reads(False):
+        recipe_ids = ShoppingList.objects.filter(
+            user_id=user_id
+        ).values_list('recipe_id', flat=True)
+        versions.update(get_versions(map(recipe_dependency, recipe_ids)))
+        rows = ShoppingListIngredient.objects.for_user(user_id)
+        content = EXPORT_FORMATS[export_format].render(rows)
+    digest = hashlib.sha256(content).hexdigest()
+    storage = storages[SHOPPING_LIST_STORAGE]
+    name = f'{digest}.{export_format}'
+    if storage.exists(name):
+        # Очистка удаляет файлы по времени изменения: повторно
+        # использованный файл должен прожить ещё полный срок.
+        os.utime(storage.path(name))
+    else:
+        name = storage.save(name, ContentFile(content))
+
+    result = {'name': name, 'etag': digest, 'format': export_format}
+    set_dependent(
+        SHOPPING_LIST_CACHE_KEY.format(user_id, export_format),
+        result,
+        versions,
+        timeout=settings.SHOPPING_LIST_CACHE_TIMEOUT,
+    )
+    return result
+
+
+@shared_task(ignore_result=True)
+def delete_stale_shopping_lists():
+    """Удаляет файлы списков покупок старше SHOPPING_LIST_EXPORT_MAX_AGE.
+
+    Срок больше времени жизни записей кэша и задач, которые ссылаются на
+    файл, поэтому удаляются только файлы, на которые никто не ссылается.
+    Заодно очищается прежний каталог списков в публичном MEDIA_ROOT.
+    """
+    deadline = timezone.now() - timedelta(
+        seconds=settings.SHOPPING_LIST_EXPORT_MAX_AGE
+    )
+    deleted = 0
+    for storage, directory in (
+        (storages[SHOPPING_LIST_STORAGE], ''),
+        (default_storage, settings.SHOPPING_LIST_LEGACY_DIR),
+    ):
+        if not storage.exists(directory):
+            continue
+        for name in storage.listdir(directory)[1]:
+            name = os.path.join(directory, name)
+            if storage.get_modified_time(name) < deadline:
+                storage.delete(name)
+                deleted += 1
+    if deleted:
+        logger.info('Удалено устаревших файлов списков покупок: %d', deleted)
+
+
+@shared_task(ignore_result=True)
+def reconcile_recipe_counters():
+    """Исправляет разошедшиеся счётчики избранного и корзин рецептов."""
+    recipe_ids = Recipe.objects.reconcile_counters()
+    if recipe_ids:
+        logger.warning('Исправлены счётчики рецептов: %s', recipe_ids)
+        bump(*map(recipe_stats_dependency, recipe_ids))
+
+
+@shared_task(ignore_result=True)
+def generate_recipe_image_variants(recipe_id):
+    """Создаёт миниатюры и WebP/AVIF-варианты изображения рецепта."""
+    if refresh_variants(Recipe, recipe_id, 'image', 'image_variants',
+                        'recipe'):
+        bump(recipe_dependency(recipe_id), RECIPES)
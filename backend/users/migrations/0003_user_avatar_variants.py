@@ -0,0 +1,21 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_alter_subscription_follower_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='avatar_variants',
+            field=models.JSONField(
+                blank=True,
+                default=dict,
+                editable=False,
+                verbose_name='Варианты аватара',
+            ),
+        ),
+    ]
@@ -36,6 +36,12 @@ class User(AbstractUser):
         blank=True,
         null=True,
     )
+    avatar_variants = models.JSONField(
+        'Варианты аватара',
+        default=dict,
+        blank=True,
+        editable=False,
+    )
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ('username',)
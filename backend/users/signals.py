@@ -0,0 +1,40 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from backend.cache import (USERS, bump, subscriptions_dependency,
+                           user_dependency)
+
+from .models import Subscription, User
+from .tasks import generate_avatar_variants
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_users_cache(sender, instance, created=False,
+                           update_fields=None, **kwargs):
+    """Меняет версию профилей, показанных в публичных ответах.
+
+    Новый пользователь ещё нигде не показан, а вход меняет только
+    `last_login`, поэтому такие сохранения кэш не трогают.
+    """
+    if created or update_fields == frozenset(('last_login',)):
+        return
+    bump(USERS, user_dependency(instance.pk))
+
+
+@receiver(post_save, sender=User)
+def schedule_avatar_variants(sender, instance, **kwargs):
+    """Запускает обработку аватара, если он сменился или удалён."""
+    source = instance.avatar.name or None
+    if instance.avatar_variants.get('source') != source:
+        transaction.on_commit(
+            lambda: generate_avatar_variants.delay(instance.pk)
+        )
+
+
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def invalidate_subscriptions(sender, instance, **kwargs):
+    """Меняет версию подписок, от которой зависит флаг `is_subscribed`."""
+    bump(subscriptions_dependency(instance.follower_id))
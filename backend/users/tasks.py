@@ -0,0 +1,13 @@
+from celery import shared_task
+
+from backend.cache import USERS, bump, user_dependency
+from backend.images import refresh_variants
+from users.models import User
+
+
+@shared_task(ignore_result=True)
+def generate_avatar_variants(user_id):
+    """Создаёт уменьшенные WebP/AVIF-варианты аватара пользователя."""
+    if refresh_variants(User, user_id, 'avatar', 'avatar_variants',
+                        'avatar'):
+        bump(USERS, user_dependency(user_id))